@@ -4,7 +4,7 @@ from fastapi_etag import Etag
 from pydantic import BaseModel
 
 from collections.abc import Iterable
-from .appstate import state, SrcInfoPackage
+from .appstate import state, SrcInfoPackage, filter_search_entries
 from .utils import extract_upstream_version, version_is_newer_than
 from .fetch.update import queue_update
 
@@ -25,8 +25,8 @@ class QueueEntry(BaseModel):
     builds: dict[str, QueueBuild]
 
 
-async def get_etag(request: Request) -> str:
-    return state.etag
+async def get_outofdate_etag(request: Request) -> str:
+    return state.get_etag("sources", "sourceinfos", "pkgextra", "ext_infos")
 
 
 router = APIRouter()
@@ -37,7 +37,7 @@ def get_srcinfos_to_build() -> tuple[list[SrcInfoPackage], set[str]]:
 
     # packages that should be updated
     for s in state.sources.values():
-        for k, p in sorted(s.packages.items()):
+        for k, p in s.sorted_packages:
             if p.name in state.sourceinfos:
                 srcinfo = state.sourceinfos[p.name]
                 if not version_is_newer_than(srcinfo.build_version, p.version):
@@ -48,12 +48,10 @@ def get_srcinfos_to_build() -> tuple[list[SrcInfoPackage], set[str]]:
     not_in_repo: dict[str, list[SrcInfoPackage]] = {}
     replaces_not_in_repo: set[str] = set()
     for srcinfo in state.sourceinfos.values():
-        not_in_repo.setdefault(srcinfo.pkgname, []).append(srcinfo)
+        if srcinfo.pkgname not in state.package_names:
+            not_in_repo.setdefault(srcinfo.pkgname, []).append(srcinfo)
         replaces_not_in_repo.update(srcinfo.replaces)
-    for s in state.sources.values():
-        for p in s.packages.values():
-            not_in_repo.pop(p.name, None)
-            replaces_not_in_repo.discard(p.name)
+    replaces_not_in_repo -= state.package_names
     marked_new: set[str] = set()
     for sis in not_in_repo.values():
         srcinfos.extend(sis)
@@ -71,7 +69,8 @@ def get_srcinfos_to_build() -> tuple[list[SrcInfoPackage], set[str]]:
 
 @router.get('/buildqueue2', response_model=list[QueueEntry])
 async def buildqueue2(request: Request, response: Response) -> list[QueueEntry]:
-    srcinfos, marked_new = get_srcinfos_to_build()
+    # compares the versions of all packages, so only do it once per state change
+    srcinfos, marked_new = state.get_derived("srcinfos_to_build", get_srcinfos_to_build)
 
     srcinfo_provides = {}
     srcinfo_replaces = {}
@@ -251,25 +250,27 @@ async def search(request: Request, response: Response, query: str = "", qtype: s
         qtype = "pkg"
 
     parts = query.split()
+    parts_lower = [p.lower() for p in parts]
     res_pkg: list[dict[str, str | list[str] | int]] = []
     exact = {}
     if not query:
         pass
     elif qtype == "pkg":
-        for s in state.sources.values():
-            if s.name.lower() == query or s.realname.lower() == query:
+        for s, realname, name in filter_search_entries(
+                state.source_search_names, state.source_search_index, parts_lower):
+            if name == query or realname == query:
                 exact = s.get_info()
                 continue
-            if [p for p in parts if p.lower() in s.name.lower()] == parts:
+            if all(p in name for p in parts_lower):
                 res_pkg.append(s.get_info())
     elif qtype == "binpkg":
-        for s in state.sources.values():
-            for sub in s.packages.values():
-                if sub.name.lower() == query or sub.realname.lower() == query:
-                    exact = s.get_info()
-                    continue
-                if [p for p in parts if p.lower() in sub.name.lower()] == parts:
-                    res_pkg.append(s.get_info())
+        for s, sub, realname, name in filter_search_entries(
+                state.package_search_names, state.package_search_index, parts_lower):
+            if name == query or realname == query:
+                exact = s.get_info()
+                continue
+            if all(p in name for p in parts_lower):
+                res_pkg.append(s.get_info())
     return JSONResponse(
         {
             'query': query,
@@ -296,7 +297,7 @@ class OutOfDateEntry(BaseModel):
     version_upstream: str
 
 
-@router.get('/outofdate', response_model=list[OutOfDateEntry], dependencies=[Depends(Etag(get_etag))])
+@router.get('/outofdate', response_model=list[OutOfDateEntry], dependencies=[Depends(Etag(get_outofdate_etag))])
 async def outofdate(request: Request, response: Response) -> list[OutOfDateEntry]:
     to_update = []
 
@@ -48,6 +48,8 @@ GENTOO_SNAPSHOT_URL = "https://mirror.leaseweb.com/gentoo/snapshots/gentoo-lates
 UPDATE_INTERVAL = 60 * 5
 UPDATE_MIN_INTERVAL = 60
 UPDATE_MIN_RATE = 1
+# After a failed update retry after 30 seconds, doubling up to UPDATE_INTERVAL
+UPDATE_RETRY_INTERVAL = 30
 
 REQUEST_TIMEOUT = 60
 CACHE_DIR: str | None = None
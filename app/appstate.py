@@ -3,26 +3,32 @@
 
 from __future__ import annotations
 
+import hashlib
 import re
+import sys
 import uuid
 import time
+import zlib
 from datetime import datetime, timezone
 from enum import Enum
-from functools import cmp_to_key
+from functools import cache, lru_cache
+from itertools import islice
 from urllib.parse import quote_plus, quote
-from typing import NamedTuple, Any
-from collections.abc import Sequence
+from typing import NamedTuple, Any, TypeVar
+from collections.abc import Callable, Hashable, Iterable, Sequence
 from pydantic import BaseModel
 from dataclasses import dataclass
 
 from .appconfig import REPOSITORIES
-from .utils import vercmp, version_is_newer_than, extract_upstream_version, split_depends, \
+from .utils import vercmp_key, version_is_newer_than, extract_upstream_version, split_depends, \
     split_optdepends, strip_vcs
 from .pkgextra import PkgExtra, PkgExtraEntry
 
 
 PackageKey = tuple[str, str, str, str, str]
 
+_T = TypeVar("_T")
+
 
 class ExtId(NamedTuple):
     id: str
@@ -66,6 +72,10 @@ class DepType(Enum):
     OPTIONAL = 2
     CHECK = 3
 
+    # Members are singletons, so hashing by identity is fine, and a lot faster
+    # than Enum.__hash__(), which hashes the member name in Python code
+    __hash__ = object.__hash__
+
 
 def get_repositories() -> list[Repository]:
     l = []
@@ -74,6 +84,15 @@ def get_repositories() -> list[Repository]:
     return l
 
 
+@cache
+def _get_repositories_by_name() -> dict[str, Repository]:
+    # in case of duplicates the first one wins, like when searching the list
+    by_name: dict[str, Repository] = {}
+    for repo in get_repositories():
+        by_name.setdefault(repo.name, repo)
+    return by_name
+
+
 def get_realname_variants(s: Source) -> list[str]:
     """Returns a list of potential names used by external systems, highest priority first"""
 
@@ -89,18 +108,53 @@ def get_realname_variants(s: Source) -> list[str]:
     return main + sorted(package_variants) + sorted(provides_variants)
 
 
+def build_search_index(names: Iterable[str]) -> dict[str, set[int]]:
+    """Maps all three character substrings of the names to the indices of the
+    names containing them"""
+
+    index: dict[str, set[int]] = {}
+    for i, name in enumerate(names):
+        for j in range(len(name) - 2):
+            index.setdefault(name[j:j + 3], set()).add(i)
+    return index
+
+
+def filter_search_entries(entries: list[_T], index: dict[str, set[int]], parts: list[str]) -> list[_T]:
+    """Returns the entries whose indexed name could contain all parts, in the
+    original order. The caller still has to check the names themselves."""
+
+    found: set[int] | None = None
+    for part in parts:
+        for j in range(len(part) - 2):
+            indices = index.get(part[j:j + 3], set())
+            found = indices if found is None else found & indices
+            if not found:
+                return []
+    if found is None:
+        # all parts are too short for the index
+        return entries
+    return [entries[i] for i in sorted(found)]
+
+
 def cleanup_files(files: list[str]) -> list[str]:
-    """Remove redundant directory paths and root them"""
+    """Remove redundant directory paths and root them. Sorts files in place."""
 
-    last = None
-    result = []
-    for path in sorted(files, reverse=True):
-        if last is not None:
-            if path.endswith("/") and last.startswith(path):
-                continue
-        result.append("/" + path)
-        last = path
-    return result[::-1]
+    # in sorted order everything below a directory directly follows it, so
+    # a directory is redundant if the next path is inside of it
+    files.sort()
+    result = ["/" + path for path, next_path in zip(files, islice(files, 1, None))
+              if not (path.endswith("/") and next_path.startswith(path))]
+    if files:
+        result.append("/" + files[-1])
+    return result
+
+
+@lru_cache(maxsize=16384)
+def iso_date_to_utc(date: str) -> str:
+    """iso 8601 to UTC without a timezone. Cached, since all packages built
+    from the same commit share the date"""
+
+    return datetime.fromisoformat(date).astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
 
 def get_base_group_name(p: Package, group_name: str) -> str:
@@ -113,6 +167,8 @@ def get_base_group_name(p: Package, group_name: str) -> str:
 
 class Repository:
 
+    __slots__ = ("name", "variant", "package_prefix", "base_prefix", "url", "download_url", "src_url")
+
     def __init__(self, name: str, variant: str, package_prefix: str, base_prefix: str, url: str, download_url: str, src_url: str):
         self.name = name
         self.variant = variant
@@ -130,24 +186,23 @@ class Repository:
     def files_url(self) -> str:
         return self.url.rstrip("/") + "/" + self.name + ".files"
 
+    def _get_packages(self) -> list[Package]:
+        return [p for s, p in state.packages_by_repo.get(self.name, [])
+                if p.repo_variant == self.variant]
+
     @property
     def packages(self) -> list[Package]:
-        global state
-
-        repo_packages = []
-        for s in state.sources.values():
-            for k, p in sorted(s.packages.items()):
-                if p.repo == self.name and p.repo_variant == self.variant:
-                    repo_packages.append(p)
-        return repo_packages
+        return state.get_derived(("repo_packages", self.name, self.variant), self._get_packages)
 
     @property
     def csize(self) -> int:
-        return sum(int(p.csize) for p in self.packages)
+        return state.get_derived(("repo_csize", self.name, self.variant),
+                                 lambda: sum(int(p.csize) for p in self.packages))
 
     @property
     def isize(self) -> int:
-        return sum(int(p.isize) for p in self.packages)
+        return state.get_derived(("repo_isize", self.name, self.variant),
+                                 lambda: sum(int(p.isize) for p in self.packages))
 
 
 class BuildStatusBuild(BaseModel):
@@ -183,7 +238,7 @@ class Severity(Enum):
         return list(Severity).index(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Vulnerability:
 
     id: str
@@ -199,12 +254,23 @@ class Vulnerability:
 class AppState:
 
     def __init__(self) -> None:
-        self._update_etag()
-
-        self._etag = ""
+        # etags have to differ between restarts, so prefix the counter with
+        # something random
+        self._etag_prefix = uuid.uuid4().hex[:8]
+        self._etag_counter = 0
+        self._region_etags: dict[str, str] = {}
         self.ready = False
         self._last_update = 0.0
         self._sources: dict[str, Source] = {}
+        self._package_names: frozenset[str] = frozenset()
+        self._source_search_names: list[tuple[Source, str, str]] | None = None
+        self._package_search_names: list[tuple[Source, Package, str, str]] | None = None
+        self._source_search_index: dict[str, set[int]] | None = None
+        self._package_search_index: dict[str, set[int]] | None = None
+        self._packages_by_name: dict[str, list[tuple[Source, Package]]] | None = None
+        self._packages_by_provides: dict[str, list[tuple[Source, Package]]] = {}
+        self._packages_by_group: dict[str, list[Package]] = {}
+        self._packages_by_repo: dict[str, list[tuple[Source, Package]]] = {}
         self._sourceinfos: dict[str, SrcInfoPackage] = {}
         self._pkgextra: PkgExtra = PkgExtra(packages={})
         self._ext_infos: dict[ExtId, dict[str, ExtInfo]] = {}
@@ -212,9 +278,16 @@ class AppState:
         self._vulnerabilities: dict[str, list[Vulnerability]] = {}
         self._update_etag()
 
-    def _update_etag(self) -> None:
-        self._etag = str(uuid.uuid4())
+    def _update_etag(self, region: str = "") -> None:
+        self._etag_counter += 1
+        self._etag = f"{self._etag_prefix}-{self._etag_counter:x}"
+        if region:
+            self._region_etags[region] = self._etag
         self._last_update = time.time()
+        # anything derived from the state has to be recomputed
+        self._upstream_info_cache: dict[str, ExtInfo | None] = {}
+        self._external_infos_cache: dict[str, Sequence[tuple[ExtId, ExtInfo]]] = {}
+        self._derived_cache: dict[Hashable, Any] = {}
 
     @property
     def last_update(self) -> float:
@@ -224,6 +297,14 @@ class AppState:
     def etag(self) -> str:
         return self._etag
 
+    def get_etag(self, *regions: str) -> str:
+        """Returns an etag which only changes if one of the given parts of the
+        state changes, e.g. get_etag("sources", "ext_infos")
+        """
+
+        key = "|".join([self._etag_prefix] + [self._region_etags.get(r, "") for r in regions])
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
     @property
     def sources(self) -> dict[str, Source]:
         return self._sources
@@ -231,7 +312,111 @@ class AppState:
     @sources.setter
     def sources(self, sources: dict[str, Source]) -> None:
         self._sources = sources
-        self._update_etag()
+        self._package_names = frozenset(
+            p.name for s in sources.values() for p in s.packages.values())
+        self._source_search_names = None
+        self._package_search_names = None
+        self._source_search_index = None
+        self._package_search_index = None
+        self._packages_by_name = None
+        self._packages_by_provides = {}
+        self._packages_by_group = {}
+        self._packages_by_repo = {}
+        self._update_etag("sources")
+
+    @property
+    def package_names(self) -> frozenset[str]:
+        """The names of all packages in all sources"""
+
+        return self._package_names
+
+    @property
+    def source_search_names(self) -> list[tuple[Source, str, str]]:
+        """All sources with their lowercase realname and name, for searching"""
+
+        if self._source_search_names is None:
+            self._source_search_names = [
+                (s, s.realname.lower(), s.name.lower()) for s in self._sources.values()]
+        return self._source_search_names
+
+    @property
+    def package_search_names(self) -> list[tuple[Source, Package, str, str]]:
+        """All packages with their source and lowercase realname and name, for searching"""
+
+        if self._package_search_names is None:
+            self._package_search_names = [
+                (s, p, p.realname.lower(), p.name.lower())
+                for s in self._sources.values() for p in s.packages.values()]
+        return self._package_search_names
+
+    @property
+    def source_search_index(self) -> dict[str, set[int]]:
+        """A build_search_index() index of the names in source_search_names"""
+
+        if self._source_search_index is None:
+            self._source_search_index = build_search_index(
+                name for s, realname, name in self.source_search_names)
+        return self._source_search_index
+
+    @property
+    def package_search_index(self) -> dict[str, set[int]]:
+        """A build_search_index() index of the names in package_search_names"""
+
+        if self._package_search_index is None:
+            self._package_search_index = build_search_index(
+                name for s, p, realname, name in self.package_search_names)
+        return self._package_search_index
+
+    def _build_package_index(self) -> None:
+        by_name: dict[str, list[tuple[Source, Package]]] = {}
+        by_provides: dict[str, list[tuple[Source, Package]]] = {}
+        by_group: dict[str, list[Package]] = {}
+        by_repo: dict[str, list[tuple[Source, Package]]] = {}
+        for s in self._sources.values():
+            for k, p in s.sorted_packages:
+                by_name.setdefault(p.name, []).append((s, p))
+                by_repo.setdefault(p.repo, []).append((s, p))
+                for prov in p.provides:
+                    by_provides.setdefault(prov, []).append((s, p))
+                for group in p.groups:
+                    by_group.setdefault(group, []).append(p)
+        self._packages_by_provides = by_provides
+        self._packages_by_group = by_group
+        self._packages_by_repo = by_repo
+        self._packages_by_name = by_name
+
+    @property
+    def packages_by_name(self) -> dict[str, list[tuple[Source, Package]]]:
+        """All packages with their source, by package name"""
+
+        if self._packages_by_name is None:
+            self._build_package_index()
+        assert self._packages_by_name is not None
+        return self._packages_by_name
+
+    @property
+    def packages_by_provides(self) -> dict[str, list[tuple[Source, Package]]]:
+        """All packages with their source, by the names they provide"""
+
+        if self._packages_by_name is None:
+            self._build_package_index()
+        return self._packages_by_provides
+
+    @property
+    def packages_by_group(self) -> dict[str, list[Package]]:
+        """All packages, by the groups they are in"""
+
+        if self._packages_by_name is None:
+            self._build_package_index()
+        return self._packages_by_group
+
+    @property
+    def packages_by_repo(self) -> dict[str, list[tuple[Source, Package]]]:
+        """All packages with their source, by repo name"""
+
+        if self._packages_by_name is None:
+            self._build_package_index()
+        return self._packages_by_repo
 
     @property
     def sourceinfos(self) -> dict[str, SrcInfoPackage]:
@@ -240,7 +425,7 @@ class AppState:
     @sourceinfos.setter
     def sourceinfos(self, sourceinfos: dict[str, SrcInfoPackage]) -> None:
         self._sourceinfos = sourceinfos
-        self._update_etag()
+        self._update_etag("sourceinfos")
 
     @property
     def pkgextra(self) -> PkgExtra:
@@ -249,7 +434,7 @@ class AppState:
     @pkgextra.setter
     def pkgextra(self, pkgextra: PkgExtra) -> None:
         self._pkgextra = pkgextra
-        self._update_etag()
+        self._update_etag("pkgextra")
 
     @property
     def ext_info_ids(self) -> list[ExtId]:
@@ -260,7 +445,34 @@ class AppState:
 
     def set_ext_infos(self, id: ExtId, info: dict[str, ExtInfo]) -> None:
         self._ext_infos[id] = info
-        self._update_etag()
+        self._update_etag("ext_infos")
+
+    def get_upstream_info(self, s: Source) -> ExtInfo | None:
+        """Like Source.upstream_info, but cached until the state changes"""
+
+        try:
+            return self._upstream_info_cache[s.name]
+        except KeyError:
+            info = self._upstream_info_cache[s.name] = s._find_upstream_info()
+            return info
+
+    def get_external_infos(self, s: Source) -> Sequence[tuple[ExtId, ExtInfo]]:
+        """Like Source.external_infos, but cached until the state changes"""
+
+        try:
+            return self._external_infos_cache[s.name]
+        except KeyError:
+            infos = self._external_infos_cache[s.name] = s._find_external_infos()
+            return infos
+
+    def get_derived(self, key: Hashable, func: Callable[[], _T]) -> _T:
+        """Returns the result of func(), cached under key until the state changes"""
+
+        try:
+            result: _T = self._derived_cache[key]
+        except KeyError:
+            result = self._derived_cache[key] = func()
+        return result
 
     @property
     def build_status(self) -> BuildStatus:
@@ -269,7 +481,7 @@ class AppState:
     @build_status.setter
     def build_status(self, build_status: BuildStatus) -> None:
         self._build_status = build_status
-        self._update_etag()
+        self._update_etag("build_status")
 
     @property
     def vulnerabilities(self) -> dict[str, list[Vulnerability]]:
@@ -278,12 +490,17 @@ class AppState:
     @vulnerabilities.setter
     def vulnerabilities(self, vulnerabilities: dict[str, list[Vulnerability]]) -> None:
         self._vulnerabilities = vulnerabilities
-        self._update_etag()
+        self._update_etag("vulnerabilities")
 
 
 class Package:
 
-    def __init__(self, builddate: str, csize: str, depends: list[str], filename: str, files: list[str], isize: str,
+    __slots__ = ("builddate", "csize", "url", "depends", "checkdepends", "filename", "_files", "isize",
+                 "makedepends", "md5sum", "name", "sha256sum", "arch", "fileurl", "repo", "repo_variant",
+                 "package_prefix", "base_prefix", "provides", "conflicts", "replaces", "version", "base",
+                 "desc", "groups", "licenses", "rdepends", "optdepends", "packager", "provided_by", "key", "realname")
+
+    def __init__(self, builddate: str, csize: str, depends: list[str], filename: str, files: bytes, isize: str,
                  makedepends: list[str], md5sum: str | None, name: str, pgpsig: str | None, sha256sum: str, arch: str,
                  base_url: str, repo: str, repo_variant: str, package_prefix: str, base_prefix: str,
                  provides: list[str], conflicts: list[str], replaces: list[str],
@@ -295,34 +512,41 @@ class Package:
         self.depends = split_depends(depends)
         self.checkdepends = split_depends(checkdepends)
         self.filename = filename
-        self._files = "\n".join(cleanup_files(files))
+        # zlib compressed by parse_repo_data(), they are large and only
+        # shown on the package page
+        self._files = files
         self.isize = isize
         self.makedepends = split_depends(makedepends)
         self.md5sum = md5sum
         self.name = name
         self.sha256sum = sha256sum
-        self.arch = arch
+        # small-cardinality strings shared by many packages, intern them to
+        # reduce memory usage
+        self.arch = sys.intern(arch)
         self.fileurl = base_url + "/" + quote(self.filename)
-        self.repo = repo
-        self.repo_variant = repo_variant
-        self.package_prefix = package_prefix
-        self.base_prefix = base_prefix
+        self.repo = sys.intern(repo)
+        self.repo_variant = sys.intern(repo_variant)
+        self.package_prefix = sys.intern(package_prefix)
+        self.base_prefix = sys.intern(base_prefix)
         self.provides = split_depends(provides)
         self.conflicts = split_depends(conflicts)
         self.replaces = split_depends(replaces)
         self.version = version
         self.base = base
         self.desc = desc
-        self.groups = groups
-        self.licenses = licenses
-        self.rdepends: dict[Package, set[DepType]] = {}
+        self.groups = tuple(sys.intern(g) for g in groups)
+        self.licenses = tuple(sys.intern(l) for l in licenses)
+        self.rdepends: dict[Package, list[DepType]] = {}
         self.optdepends = split_optdepends(optdepends)
         self.packager = parse_packager(packager)
         self.provided_by: set[Package] = set()
+        # used for sorting and as the key in Source.packages, so build it once
+        self.key: PackageKey = (self.repo, self.repo_variant, self.name, self.arch, self.fileurl)
+        self.realname = strip_vcs(name[len(package_prefix):] if name.startswith(package_prefix) else name)
 
     @property
     def files(self) -> Sequence[str]:
-        return self._files.splitlines()
+        return zlib.decompress(self._files).decode("utf-8").splitlines()
 
     def __repr__(self) -> str:
         return "Package(%s)" % self.fileurl
@@ -362,12 +586,6 @@ class Package:
             prov[key] = infos
         return prov
 
-    @property
-    def realname(self) -> str:
-        if self.name.startswith(self.package_prefix):
-            return strip_vcs(self.name[len(self.package_prefix):])
-        return strip_vcs(self.name)
-
     @property
     def git_version(self) -> str:
         if self.name in state.sourceinfos:
@@ -378,10 +596,8 @@ class Package:
     def repo_url(self) -> str:
         if self.name in state.sourceinfos:
             return state.sourceinfos[self.name].repo_url
-        for repo in get_repositories():
-            if repo.name == self.repo:
-                return repo.src_url
-        return ""
+        repo = _get_repositories_by_name().get(self.repo)
+        return repo.src_url if repo is not None else ""
 
     @property
     def repo_path(self) -> str:
@@ -391,10 +607,17 @@ class Package:
 
     @property
     def history_url(self) -> str:
+        srcinfo = state.sourceinfos.get(self.name)
+        if srcinfo is not None:
+            # the srcinfo has the path quoted already
+            return srcinfo.history_url
         return self.repo_url + ("/commits/master/" + quote(self.repo_path))
 
     @property
     def source_url(self) -> str:
+        srcinfo = state.sourceinfos.get(self.name)
+        if srcinfo is not None:
+            return srcinfo.source_url
         return self.repo_url + ("/tree/master/" + quote(self.repo_path))
 
     @property
@@ -404,16 +627,11 @@ class Package:
         filename = f"{self.base}-{self.version}.src.tar.{ext_type}"
         return self.fileurl.rsplit("/", 2)[0] + "/sources/" + quote(filename)
 
-    @property
-    def key(self) -> PackageKey:
-        return (self.repo, self.repo_variant,
-                self.name, self.arch, self.fileurl)
-
     @classmethod
-    def from_desc(cls: type[Package], d: dict[str, list[str]], base: str, repo: Repository) -> Package:
+    def from_desc(cls: type[Package], d: dict[str, list[str]], files: bytes, base: str, repo: Repository) -> Package:
         return cls(d["%BUILDDATE%"][0], d["%CSIZE%"][0],
                    d.get("%DEPENDS%", []), d["%FILENAME%"][0],
-                   d.get("%FILES%", []), d["%ISIZE%"][0],
+                   files, d["%ISIZE%"][0],
                    d.get("%MAKEDEPENDS%", []),
                    d.get("%MD5SUM%", [None])[0], d["%NAME%"][0],
                    d.get("%PGPSIG%", [None])[0], d["%SHA256SUM%"][0],
@@ -429,9 +647,34 @@ class Package:
 
 class Source:
 
+    __slots__ = ("name", "packages", "_sorted_packages", "_realname", "_realname_variants",
+                 "_version", "_date", "_licenses", "_repos", "_arches", "_groups", "_basegroups")
+
     def __init__(self, name: str):
         self.name = name
         self.packages: dict[PackageKey, Package] = {}
+        self._clear_cache()
+
+    def _clear_cache(self) -> None:
+        # everything derived from the packages only, reset when they change
+        self._sorted_packages: list[tuple[PackageKey, Package]] | None = None
+        self._realname: str | None = None
+        self._realname_variants: list[str] | None = None
+        self._version: str | None = None
+        self._date: int | None = None
+        self._licenses: list[tuple[str, ...]] | None = None
+        self._repos: list[str] | None = None
+        self._arches: list[str] | None = None
+        self._groups: list[str] | None = None
+        self._basegroups: list[str] | None = None
+
+    @property
+    def sorted_packages(self) -> list[tuple[PackageKey, Package]]:
+        """The packages sorted by their key, cached until new packages get added"""
+
+        if self._sorted_packages is None:
+            self._sorted_packages = sorted(self.packages.items())
+        return self._sorted_packages
 
     @property
     def desc(self) -> str:
@@ -447,7 +690,7 @@ class Source:
 
     @property
     def _package(self) -> Package:
-        return sorted(self.packages.items())[0][1]
+        return self.sorted_packages[0][1]
 
     @property
     def all_vulnerabilities(self) -> list[Vulnerability]:
@@ -483,7 +726,9 @@ class Source:
 
     @property
     def repos(self) -> list[str]:
-        return sorted({p.repo for p in self.packages.values()})
+        if self._repos is None:
+            self._repos = sorted({p.repo for p in self.packages.values()})
+        return self._repos
 
     @property
     def url(self) -> str:
@@ -491,44 +736,57 @@ class Source:
 
     @property
     def arches(self) -> list[str]:
-        return sorted({p.arch for p in self.packages.values()})
+        if self._arches is None:
+            self._arches = sorted({p.arch for p in self.packages.values()})
+        return self._arches
 
     @property
     def groups(self) -> list[str]:
-        groups: set[str] = set()
-        for p in self.packages.values():
-            groups.update(p.groups)
-        return sorted(groups)
+        if self._groups is None:
+            groups: set[str] = set()
+            for p in self.packages.values():
+                groups.update(p.groups)
+            self._groups = sorted(groups)
+        return self._groups
 
     @property
     def basegroups(self) -> list[str]:
-        groups: set[str] = set()
-        for p in self.packages.values():
-            groups.update(get_base_group_name(p, g) for g in p.groups)
-        return sorted(groups)
+        if self._basegroups is None:
+            groups: set[str] = set()
+            for p in self.packages.values():
+                groups.update(get_base_group_name(p, g) for g in p.groups)
+            self._basegroups = sorted(groups)
+        return self._basegroups
 
     @property
     def version(self) -> str:
         # get the newest version
-        versions: set[str] = {p.version for p in self.packages.values()}
-        return sorted(versions, key=cmp_to_key(vercmp), reverse=True)[0]
+        if self._version is None:
+            versions: set[str] = {p.version for p in self.packages.values()}
+            self._version = max(versions, key=vercmp_key)
+        return self._version
 
     @property
     def git_version(self) -> str:
         # get the newest version
         versions: set[str] = {p.git_version for p in self.packages.values()}
-        return sorted(versions, key=cmp_to_key(vercmp), reverse=True)[0]
+        return max(versions, key=vercmp_key)
 
     @property
-    def licenses(self) -> list[list[str]]:
-        licenses: list[list[str]] = []
-        for p in self.packages.values():
-            if p.licenses and p.licenses not in licenses:
-                licenses.append(p.licenses)
-        return sorted(licenses)
+    def licenses(self) -> list[tuple[str, ...]]:
+        if self._licenses is None:
+            licenses: list[tuple[str, ...]] = []
+            for p in self.packages.values():
+                if p.licenses and p.licenses not in licenses:
+                    licenses.append(p.licenses)
+            self._licenses = sorted(licenses)
+        return self._licenses
 
     @property
     def upstream_info(self) -> ExtInfo | None:
+        return state.get_upstream_info(self)
+
+    def _find_upstream_info(self) -> ExtInfo | None:
         # Take the newest version of the external versions
         newest = None
         fallback = None
@@ -559,8 +817,19 @@ class Source:
     def urls(self) -> list[tuple[str, str]]:
         return self._package.urls
 
+    @property
+    def realname_variants(self) -> list[str]:
+        """Like get_realname_variants(), cached until new packages get added"""
+
+        if self._realname_variants is None:
+            self._realname_variants = get_realname_variants(self)
+        return self._realname_variants
+
     @property
     def external_infos(self) -> Sequence[tuple[ExtId, ExtInfo]]:
+        return state.get_external_infos(self)
+
+    def _find_external_infos(self) -> Sequence[tuple[ExtId, ExtInfo]]:
         global state
 
         # internal package, don't try to link it
@@ -576,7 +845,7 @@ class Source:
                     continue
                 variants = [mapped]
             elif ext_id.guess_name:
-                variants = get_realname_variants(self)
+                variants = self.realname_variants
 
             infos = state.get_ext_infos(ext_id)
             for realname in variants:
@@ -610,15 +879,21 @@ class Source:
 
     @property
     def realname(self) -> str:
-        if self.name.startswith(self._package.base_prefix):
-            return strip_vcs(self.name[len(self._package.base_prefix):])
-        return strip_vcs(self.name)
+        if self._realname is None:
+            base_prefix = self._package.base_prefix
+            if self.name.startswith(base_prefix):
+                self._realname = strip_vcs(self.name[len(base_prefix):])
+            else:
+                self._realname = strip_vcs(self.name)
+        return self._realname
 
     @property
     def date(self) -> int:
         """The build date of the newest package"""
 
-        return sorted([p.builddate for p in self.packages.values()])[-1]
+        if self._date is None:
+            self._date = max(p.builddate for p in self.packages.values())
+        return self._date
 
     @property
     def repo_url(self) -> str:
@@ -664,10 +939,15 @@ class Source:
 
         return cls(base)
 
-    def add_desc(self, d: dict[str, list[str]], repo: Repository) -> None:
-        p = Package.from_desc(d, self.name, repo)
+    def add_desc(self, d: dict[str, list[str]], files: bytes, repo: Repository) -> None:
+        p = Package.from_desc(d, files, self.name, repo)
         assert p.key not in self.packages
         self.packages[p.key] = p
+        self._clear_cache()
+
+    def add_packages(self, packages: dict[PackageKey, Package]) -> None:
+        self.packages.update(packages)
+        self._clear_cache()
 
     def get_info(self) -> dict[str, Any]:
         return {
@@ -687,6 +967,10 @@ class Source:
 
 class SrcInfoPackage:
 
+    __slots__ = ("pkgbase", "pkgname", "pkgver", "pkgrel", "repo", "repo_url", "repo_path", "date", "epoch",
+                 "depends", "makedepends", "provides", "conflicts", "replaces", "sources", "pkgbasedesc",
+                 "_quoted_repo_path")
+
     def __init__(self, pkgbase: str, pkgname: str, pkgver: str, pkgrel: str,
                  repo: str, repo_url: str, repo_path: str, date: str, pkgbasedesc: str | None):
         self.pkgbase = pkgbase
@@ -696,8 +980,10 @@ class SrcInfoPackage:
         self.repo = repo
         self.repo_url = repo_url
         self.repo_path = repo_path
-        # iso 8601 to UTC without a timezone
-        self.date = datetime.fromisoformat(date).astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        # for building the URLs, reuse repo_path if there is nothing to quote
+        quoted = quote(repo_path)
+        self._quoted_repo_path = repo_path if quoted == repo_path else quoted
+        self.date = iso_date_to_utc(date)
         self.epoch: str | None = None
         self.depends: dict[str, set[str]] = {}
         self.makedepends: dict[str, set[str]] = {}
@@ -709,11 +995,11 @@ class SrcInfoPackage:
 
     @property
     def history_url(self) -> str:
-        return self.repo_url + ("/commits/master/" + quote(self.repo_path))
+        return self.repo_url + "/commits/master/" + self._quoted_repo_path
 
     @property
     def source_url(self) -> str:
-        return self.repo_url + ("/tree/master/" + quote(self.repo_path))
+        return self.repo_url + "/tree/master/" + self._quoted_repo_path
 
     @property
     def build_version(self) -> str:
@@ -726,30 +1012,26 @@ class SrcInfoPackage:
         return f"<{type(self).__name__} {self.pkgname} {self.build_version}>"
 
     @classmethod
-    def for_srcinfo(cls, srcinfo: str, repo: str, repo_url: str, repo_path: str, date: str) -> set[SrcInfoPackage]:
-        # parse pkgbase and then each pkgname
+    def for_srcinfo(cls, srcinfo: str, repo: str, repo_url: str, repo_path: str, date: str,
+                    _re: Any = re.compile(
+                        r"^[ \t]*(pkgbase|pkgname|pkgver|pkgrel|epoch|pkgdesc|depends|makedepends|"
+                        r"conflicts|provides|replaces|sources) =[ \t]*(.*?)[ \t\r]*$", re.M)) -> set[SrcInfoPackage]:
+        # parse pkgbase and then each pkgname, skipping all keys we don't use
         base: dict[str, list[str]] = {}
         sub: dict[str, dict[str, list[str]]] = {}
         current = None
-        for line in srcinfo.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-
-            key, value = line.split(" =", 1)
-            value = value.strip()
-            values = [value] if value else []
-
+        for key, value in _re.findall(srcinfo):
             if current is None and key == "pkgbase":
                 current = base
             elif key == "pkgname":
-                name = line.split(" = ", 1)[-1]
-                sub[name] = {}
-                current = sub[name]
+                sub[value] = {}
+                current = sub[value]
             if current is None:
                 continue
 
-            current.setdefault(key, []).extend(values)
+            values = current.setdefault(key, [])
+            if value:
+                values.append(value)
 
         # everything not set in the packages, take from the base
         for bkey, bvalue in base.items():
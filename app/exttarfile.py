@@ -1,7 +1,14 @@
+import gzip
 import io
 import tarfile
+from collections.abc import Iterator
+from typing import IO
+
 import zstandard
 
+_NUL_BLOCK = b"\0" * 512
+_CHUNK_SIZE = 1 << 20
+
 
 class ExtTarFile(tarfile.TarFile):
     """Extends TarFile to support zstandard"""
@@ -27,3 +34,164 @@ class ExtTarFile(tarfile.TarFile):
         return t
 
     OPEN_METH = {"zstd": "zstdopen", **tarfile.TarFile.OPEN_METH}
+
+
+def _open_decompressed(data: bytes) -> IO[bytes]:
+    """Returns a file object which decompresses the data while reading, so
+    the whole uncompressed archive never has to be in memory at once.
+    """
+
+    if data[:2] == b"\x1f\x8b":
+        return gzip.GzipFile(fileobj=io.BytesIO(data))  # type: ignore
+    elif data[:4] == b"\x28\xb5\x2f\xfd":
+        return zstandard.ZstdDecompressor().stream_reader(data)
+    elif data[257:262] == b"ustar":
+        return io.BytesIO(data)
+    raise tarfile.ReadError("unsupported compression")
+
+
+def _fill(fileobj: IO[bytes], buf: bytes, pos: int, size: int) -> bytes:
+    """Returns the buffer content starting at pos with at least size bytes,
+    reading more from fileobj as needed. Shorter only at the end of the stream.
+    """
+
+    # skip over content we don't need without keeping it around
+    skip = pos - len(buf)
+    while skip > 0:
+        chunk = fileobj.read(min(skip, _CHUNK_SIZE))
+        if not chunk:
+            break
+        skip -= len(chunk)
+
+    parts = [buf[pos:]]
+    available = len(parts[0])
+    while available < size:
+        chunk = fileobj.read(max(size - available, _CHUNK_SIZE))
+        if not chunk:
+            break
+        parts.append(chunk)
+        available += len(chunk)
+    return b"".join(parts)
+
+
+def _parse_pax_headers(data: bytes) -> dict[bytes, bytes]:
+    headers = {}
+    pos = 0
+    try:
+        while pos < len(data) and data[pos:pos + 1] != b"\0":
+            sep = data.index(b" ", pos)
+            length = int(data[pos:sep])
+            if length <= 0:
+                raise ValueError("invalid record length")
+            key, value = data[sep + 1:pos + length - 1].split(b"=", 1)
+            headers[key] = value
+            pos += length
+    except ValueError as e:
+        raise tarfile.ReadError("invalid pax header") from e
+    return headers
+
+
+def iter_tar_stream(fileobj: IO[bytes], suffixes: tuple[str, ...]) -> Iterator[tuple[str, int, bytes | None]]:
+    """Yields the name, mtime and content of all regular files in an
+    uncompressed tar stream. The content is only read for files whose name
+    ends with one of the given suffixes, and is None otherwise.
+
+    This is a lot faster than going through TarFile, since it only looks at
+    the header fields we need. Supports ustar with pax or GNU long names.
+    Raises tarfile.ReadError for everything else, so the caller can fall back
+    to TarFile.
+    """
+
+    buf = b""
+    pos = 0
+    long_name: bytes | None = None
+    pax: dict[bytes, bytes] = {}
+    while True:
+        if pos + 512 > len(buf):
+            buf = _fill(fileobj, buf, pos, 512)
+            pos = 0
+            if len(buf) < 512:
+                break
+        header = buf[pos:pos + 512]
+        if header == _NUL_BLOCK:
+            break
+        if header[257:262] != b"ustar":
+            raise tarfile.ReadError("not a ustar header")
+        typeflag = header[156:157]
+        try:
+            if b"size" in pax:
+                size = int(pax[b"size"])
+            else:
+                size = int(header[124:136].rstrip(b"\0 ") or b"0", 8)
+        except ValueError as e:
+            raise tarfile.ReadError("invalid size field") from e
+        start = pos + 512
+        pos = start + ((size + 511) & ~511)
+
+        is_extended = typeflag in (b"x", b"L", b"K")
+        if typeflag in (b"0", b"\0", b"7"):
+            if long_name is not None:
+                name = long_name
+            elif b"path" in pax:
+                name = pax[b"path"]
+            else:
+                name = header[:100].split(b"\0", 1)[0]
+                # GNU tar uses the prefix field for other things
+                if header[257:263] == b"ustar\0":
+                    prefix = header[345:500].split(b"\0", 1)[0]
+                    if prefix:
+                        name = prefix + b"/" + name
+            path = name.decode("utf-8", "surrogateescape")
+        elif is_extended:
+            path = ""
+        elif typeflag in (b"5", b"1", b"2", b"3", b"4", b"6"):
+            long_name = None
+            pax = {}
+            continue
+        else:
+            # global pax headers, sparse files etc., leave those to TarFile
+            raise tarfile.ReadError("unsupported header type")
+
+        content = None
+        if is_extended or path.endswith(suffixes):
+            if pos > len(buf):
+                buf = _fill(fileobj, buf, start, pos - start)
+                pos -= start
+                start = 0
+                if start + size > len(buf):
+                    raise tarfile.ReadError("unexpected end of data")
+            content = buf[start:start + size]
+
+        if typeflag == b"x":
+            assert content is not None
+            pax = _parse_pax_headers(content)
+        elif typeflag == b"L":
+            assert content is not None
+            long_name = content.split(b"\0", 1)[0]
+        elif typeflag == b"K":
+            pass
+        else:
+            try:
+                if b"mtime" in pax:
+                    mtime = int(float(pax[b"mtime"]))
+                else:
+                    mtime = int(header[136:148].rstrip(b"\0 ") or b"0", 8)
+            except ValueError as e:
+                raise tarfile.ReadError("invalid mtime field") from e
+            long_name = None
+            pax = {}
+            yield (path, mtime, content)
+
+
+def iter_tar_files(data: bytes, suffixes: tuple[str, ...]) -> Iterator[tuple[str, bytes]]:
+    """Yields the name and content of all regular files in a compressed tar
+    archive whose name ends with one of the given suffixes.
+
+    Like iter_tar_stream(), but for gzip, zstd or uncompressed archives in
+    memory.
+    """
+
+    with _open_decompressed(data) as f:
+        for path, mtime, content in iter_tar_stream(f, suffixes):
+            if content is not None:
+                yield (path, content)
@@ -2,14 +2,13 @@
 # SPDX-License-Identifier: MIT
 
 import asyncio
-import json
 
 from ..appconfig import ARCH_REPO_CONFIG, AUR_METADATA_URL, REQUEST_TIMEOUT
 from ..appstate import ExtId, ExtInfo, Repository, state
 from ..utils import (arch_version_to_msys, extract_upstream_version, logger,
                      version_is_newer_than)
 from .source import parse_repo
-from .utils import check_needs_update, get_content_cached
+from .utils import check_needs_update, get_content_cached, json_loads
 
 
 async def update_arch_versions() -> None:
@@ -29,9 +28,14 @@ async def update_arch_versions() -> None:
             )
         )
 
+    # the AUR metadata is large, so download it while the repos get parsed
+    aur_data, repo_sources = await asyncio.gather(
+        get_content_cached(AUR_METADATA_URL, timeout=REQUEST_TIMEOUT),
+        asyncio.gather(*awaitables))
+
     # priority: real packages > real provides > aur packages > aur provides
 
-    for sources in (await asyncio.gather(*awaitables)):
+    for sources in repo_sources:
         for source in sources.values():
             version = extract_upstream_version(arch_version_to_msys(source.version))
             for p in source.packages.values():
@@ -65,30 +69,31 @@ async def update_arch_versions() -> None:
     state.set_ext_infos(ExtId("archlinux", "Arch Linux", False, True), arch_versions)
 
     logger.info("update versions from AUR")
+    aur_versions = await asyncio.to_thread(parse_aur_versions, aur_data)
+    logger.info("done")
+    state.set_ext_infos(ExtId("aur", "AUR", True, True), aur_versions)
+
+
+def parse_aur_versions(data: bytes) -> dict[str, ExtInfo]:
     aur_versions: dict[str, ExtInfo] = {}
-    r = await get_content_cached(AUR_METADATA_URL,
-                                 timeout=REQUEST_TIMEOUT)
-    items = json.loads(r)
-    for item in items:
+    items = json_loads(data)
+    # converted once per entry, the provides below need them again
+    msys_versions = [extract_upstream_version(arch_version_to_msys(item["Version"])) for item in items]
+    for item, msys_ver in zip(items, msys_versions):
         name = item["Name"]
         if name in aur_versions:
             continue
-        version = item["Version"]
-        msys_ver = extract_upstream_version(arch_version_to_msys(version))
         last_modified = item["LastModified"]
         url = "https://aur.archlinux.org/packages/%s" % name
         aur_versions[name] = ExtInfo(name, msys_ver, last_modified, url, {})
 
-    for item in items:
+    for item, msys_ver in zip(items, msys_versions):
         name = item["Name"]
         for provides in sorted(item.get("Provides", [])):
             if provides in aur_versions:
                 continue
-            version = item["Version"]
-            msys_ver = extract_upstream_version(arch_version_to_msys(version))
             last_modified = item["LastModified"]
             url = "https://aur.archlinux.org/packages/%s" % name
             aur_versions[provides] = ExtInfo(provides, msys_ver, last_modified, url, {})
 
-    logger.info("done")
-    state.set_ext_infos(ExtId("aur", "AUR", True, True), aur_versions)
+    return aur_versions
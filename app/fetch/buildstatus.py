@@ -1,6 +1,9 @@
 # Copyright 2016-2020 Christoph Reiter
 # SPDX-License-Identifier: MIT
 
+import asyncio
+import datetime
+
 from ..appconfig import BUILD_STATUS_URLS, REQUEST_TIMEOUT
 from ..appstate import BuildStatus, state
 from ..utils import logger
@@ -13,14 +16,16 @@ async def update_build_status() -> None:
         return
 
     logger.info("update build status")
-    responses = []
-    for url in urls:
+
+    async def load(url: str) -> tuple[datetime.datetime | None, str, bytes]:
         logger.info("Loading %r" % url)
         data, mtime = await get_content_cached_mtime(url, timeout=REQUEST_TIMEOUT)
         logger.info(f"Done: {url!r}, {str(mtime)!r}")
-        responses.append((mtime, url, data))
+        return (mtime, url, data)
+
+    responses = await asyncio.gather(*(load(url) for url in urls))
 
     # use the newest of all status summaries
-    newest = sorted(responses)[-1]
+    newest = max(responses)
     logger.info(f"Selected: {newest[1]!r}")
     state.build_status = BuildStatus.model_validate_json(newest[2])
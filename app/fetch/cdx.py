@@ -1,19 +1,19 @@
 # Copyright 2024 Christoph Reiter
 # SPDX-License-Identifier: MIT
 
-import json
+import asyncio
 
 from ..appconfig import CDX_URLS, REQUEST_TIMEOUT
 from ..appstate import Severity, Vulnerability, state
 from ..utils import logger
-from .utils import check_needs_update, get_content_cached
+from .utils import check_needs_update, get_content_cached, json_loads
 
 
 def parse_cdx(data: bytes) -> dict[str, list[Vulnerability]]:
     """Parse the cdx data and returns a mapping of pkgbase names to a list of
     vulnerabilities."""
 
-    cdx = json.loads(data)
+    cdx = json_loads(data)
 
     mapping = {}
     for component in cdx["components"]:
@@ -52,11 +52,15 @@ async def update_cdx() -> None:
         return
 
     logger.info("update cdx")
-    vuln_mapping = {}
-    for url in urls:
+
+    async def load(url: str) -> bytes:
         logger.info("Loading %r" % url)
         data = await get_content_cached(url, timeout=REQUEST_TIMEOUT)
         logger.info(f"Done: {url!r}")
+        return data
+
+    vuln_mapping = {}
+    for data in await asyncio.gather(*(load(url) for url in urls)):
         vuln_mapping.update(parse_cdx(data))
 
     state.vulnerabilities = vuln_mapping
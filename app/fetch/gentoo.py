@@ -2,13 +2,14 @@
 # SPDX-License-Identifier: MIT
 
 import asyncio
-import functools
 import io
+import lzma
 import tarfile
 
 from ..appconfig import GENTOO_SNAPSHOT_URL, REQUEST_TIMEOUT
 from ..appstate import ExtId, ExtInfo, state
-from ..utils import logger, vercmp
+from ..exttarfile import iter_tar_stream
+from ..utils import logger, vercmp_key
 from .utils import check_needs_update, get_content_cached
 
 
@@ -24,31 +25,49 @@ async def update_gentoo_versions() -> None:
     state.set_ext_infos(ExtId("gentoo", "Gentoo", True, True), gentoo_versions)
 
 
-def parse_gentoo_versions(data: bytes) -> dict[str, ExtInfo]:
-    packages: dict[str, dict[str, int]] = {}
-    masked = set()
+def _iter_gentoo_files(data: bytes) -> list[tuple[str, int, bytes | None]]:
+    suffixes = ("/profiles/package.mask",)
+    try:
+        with lzma.open(io.BytesIO(data)) as f:
+            return list(iter_tar_stream(f, suffixes))
+    except (tarfile.ReadError, lzma.LZMAError):
+        # something the fast reader doesn't handle, so go through TarFile
+        pass
+
+    files = []
     with io.BytesIO(data) as f:
         with tarfile.open(fileobj=f, mode="r") as tar:
             for tarinfo in tar:
-                name = tarinfo.name
-
-                # Find package versions that are masked because they are unstable
-                # This only covers a tiny amount of packages, but it's better than nothing
-                if name.endswith("/profiles/package.mask") and tarinfo.isreg():
-                    content = tar.extractfile(tarinfo)
-                    assert content is not None
-                    for line in content.read().decode().splitlines():
-                        if line.startswith("~"):
-                            masked.add(line[1:])
-
-                # All packages
-                if name.endswith(".ebuild") and name.count("/") > 1 and tarinfo.isreg():
-                    gentoo_name = name.rsplit("/", 1)[0].split("/", 1)[-1]
-                    mtime = tarinfo.mtime
-                    package_name = gentoo_name.split("/", 1)[1]
-                    basename = name.rsplit("/", 1)[-1]
-                    version = basename[len(package_name) + 1:].rsplit(".", 1)[0]
-                    packages.setdefault(gentoo_name, {})[version] = int(mtime)
+                if not tarinfo.isreg():
+                    continue
+                content = None
+                if tarinfo.name.endswith(suffixes):
+                    infofile = tar.extractfile(tarinfo)
+                    assert infofile is not None
+                    content = infofile.read()
+                files.append((tarinfo.name, int(tarinfo.mtime), content))
+    return files
+
+
+def parse_gentoo_versions(data: bytes) -> dict[str, ExtInfo]:
+    packages: dict[str, dict[str, int]] = {}
+    masked = set()
+    for name, mtime, content in _iter_gentoo_files(data):
+
+        # Find package versions that are masked because they are unstable
+        # This only covers a tiny amount of packages, but it's better than nothing
+        if content is not None:
+            for line in content.decode().splitlines():
+                if line.startswith("~"):
+                    masked.add(line[1:])
+
+        # All packages
+        if name.endswith(".ebuild") and name.count("/") > 1:
+            gentoo_name = name.rsplit("/", 1)[0].split("/", 1)[-1]
+            package_name = gentoo_name.split("/", 1)[1]
+            basename = name.rsplit("/", 1)[-1]
+            version = basename[len(package_name) + 1:].rsplit(".", 1)[0]
+            packages.setdefault(gentoo_name, {})[version] = mtime
 
     infos = {}
     for gentoo_name, versions in packages.items():
@@ -67,7 +86,8 @@ def parse_gentoo_versions(data: bytes) -> dict[str, ExtInfo]:
             continue
 
         # TODO: Not sure if the version sorting is correct for gentoo..
-        newest_version = sorted(versions, key=functools.cmp_to_key(vercmp))[-1]
+        # reversed, so equal versions resolve to the last one, like a stable sort
+        newest_version = max(reversed(versions.keys()), key=vercmp_key)
         package_name = gentoo_name.split("/", 1)[1]
         info = ExtInfo(gentoo_name, newest_version, versions[newest_version],
                        f"https://packages.gentoo.org/packages/{gentoo_name}", {})
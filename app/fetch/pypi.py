@@ -1,21 +1,22 @@
 # Copyright 2016-2020 Christoph Reiter
 # SPDX-License-Identifier: MIT
 
+import asyncio
 import datetime
 import gzip
-import json
 import re
+from typing import Any
 
 from ..appconfig import PYPI_URLS, REQUEST_TIMEOUT
 from ..appstate import ExtId, ExtInfo, state
 from ..pkgextra import PkgExtra
 from ..utils import logger
-from .utils import check_needs_update, get_content_cached
+from .utils import check_needs_update, get_content_cached, json_loads
 
 
-def normalize(name: str) -> str:
+def normalize(name: str, _re: Any = re.compile(r"[-_.]+")) -> str:
     # https://packaging.python.org/en/latest/specifications/name-normalization/
-    return re.sub(r"[-_.]+", "-", name).lower()
+    return str(_re.sub("-", name).lower())
 
 
 async def update_pypi_versions(pkgextra: PkgExtra) -> None:
@@ -23,11 +24,13 @@ async def update_pypi_versions(pkgextra: PkgExtra) -> None:
     if not await check_needs_update(urls):
         return
 
-    projects = {}
-    for url in urls:
+    async def load(url: str) -> bytes:
         logger.info("Loading %r" % url)
-        data = await get_content_cached(url, timeout=REQUEST_TIMEOUT)
-        json_obj = json.loads(gzip.decompress(data).decode("utf-8"))
+        return await get_content_cached(url, timeout=REQUEST_TIMEOUT)
+
+    projects = {}
+    for data in await asyncio.gather(*(load(url) for url in urls)):
+        json_obj = json_loads(gzip.decompress(data))
         projects.update(json_obj.get("projects", {}))
 
     pypi_versions = {}
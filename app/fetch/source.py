@@ -2,104 +2,219 @@
 # SPDX-License-Identifier: MIT
 
 import asyncio
+import functools
 import io
+import multiprocessing
+import os
+import tarfile
+import zlib
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Any
 
 from ..appconfig import REQUEST_TIMEOUT
-from ..appstate import (DepType, Package, Repository, Source, get_repositories,
-                        state)
-from ..exttarfile import ExtTarFile
+from ..appstate import (DepType, Package, PackageKey, Repository, Source,
+                        cleanup_files, get_repositories, state)
+from ..exttarfile import ExtTarFile, iter_tar_files
 from ..utils import logger
-from .utils import check_needs_update, get_content_cached
+from .utils import check_needs_update, get_content_cached_file
+
+
+# The files in a repo db which contain package metadata
+_DESC_FILES = ("/desc", "/depends", "/files")
+
+# Fields we never look at, but which can be large
+_DESC_SKIP = frozenset(["%PGPSIG%"])
+
+# The file list of packages without one, e.g. in a .db instead of a .files
+_NO_FILES = zlib.compress(b"", 1)
 
 
 def parse_desc(t: str) -> dict[str, list[str]]:
+    # pacman writes the values already stripped, so no need to strip here.
+    # Every field is separated by an empty line, and starts with its name.
     d: dict[str, list[str]] = {}
-    cat = None
-    values: list[str] = []
-    for l in t.splitlines():
-        l = l.strip()
-        if cat is None:
-            cat = l
-        elif not l:
-            d[cat] = values
-            cat = None
-            values = []
-        else:
-            values.append(l)
-    if cat is not None:
-        d[cat] = values
+    for block in t.split("\n\n"):
+        values = block.splitlines()
+        if values:
+            cat = values.pop(0)
+            if cat not in _DESC_SKIP:
+                d[cat] = values
     return d
 
 
+def _iter_repo_files(data: bytes) -> Iterator[tuple[str, bytes]]:
+    with io.BytesIO(data) as f:
+        with ExtTarFile.open(fileobj=f, mode="r") as tar:
+            for info in tar:
+                # skip everything we don't parse before reading its content
+                if not info.name.endswith(_DESC_FILES):
+                    continue
+                infofile = tar.extractfile(info)
+                if infofile is None:
+                    continue
+                with infofile:
+                    yield (info.name, infofile.read())
+
+
+def _parse_repo_files(files: Iterable[tuple[str, bytes]]) -> list[tuple[dict[str, list[str]], bytes]]:
+    descs: dict[str, dict[str, list[str]]] = {}
+    file_lists: dict[str, bytes] = {}
+    current = ""
+    infos: list[tuple[str, bytes]] = []
+
+    def flush() -> None:
+        # The files of one package don't share any fields, so in case they
+        # are not next to each other in the archive we can just merge them.
+        # Parse them one by one, so a missing trailing newline in one can't
+        # leak into the next one.
+        desc: dict[str, list[str]] = {}
+        for name, data in sorted(infos):
+            desc.update(parse_desc(data.decode("utf-8")))
+        if "%FILES%" in desc:
+            # The file lists make up most of the data, but are rarely looked
+            # at, so only keep them compressed. Doing it right away means only
+            # one of them is around uncompressed at a time, and there is a lot
+            # less data to pass back from the worker process.
+            files = "\n".join(cleanup_files(desc.pop("%FILES%")))
+            file_lists[current] = zlib.compress(files.encode("utf-8"), 1)
+        descs.setdefault(current, {}).update(desc)
+        infos.clear()
+
+    for name, data in files:
+        package_name = name.split("/", 1)[0]
+        # entries are grouped by package, so parse each package
+        # as soon as it is complete instead of keeping all data around
+        if package_name != current:
+            if infos:
+                flush()
+            current = package_name
+        infos.append((name, data))
+    if infos:
+        flush()
+
+    return [(descs[k], file_lists.get(k, _NO_FILES)) for k in sorted(descs)]
+
+
+def parse_repo_data(data: bytes) -> list[tuple[dict[str, list[str]], bytes]]:
+    """Parses all package entries of a repo db archive. Returns the fields
+    and the zlib compressed file list of each package.
+    """
+
+    try:
+        return _parse_repo_files(iter_tar_files(data, _DESC_FILES))
+    except tarfile.ReadError:
+        # something the fast reader doesn't handle, so go through TarFile
+        return _parse_repo_files(_iter_repo_files(data))
+
+
+def parse_repo_file(path: str) -> list[tuple[dict[str, list[str]], bytes]]:
+    """Like parse_repo_data(), but reads the archive from a file.
+
+    CPU bound, so gets called in a worker process by parse_repo().
+    """
+
+    with open(path, "rb") as h:
+        return parse_repo_data(h.read())
+
+
+# There are more repos than CPUs usually, so limit the number of worker
+# processes running at the same time
+_PARSE_WORKERS = min(os.cpu_count() or 1, 8)
+
+
+@functools.cache
+def _get_parse_semaphore() -> asyncio.Semaphore:
+    return asyncio.Semaphore(_PARSE_WORKERS)
+
+
+@functools.cache
+def _get_parse_executor() -> ProcessPoolExecutor:
+    # Shared by all repos and kept around between updates. Uses "spawn" and
+    # not the default "fork", since other threads are running at the same
+    # time (asyncio.to_thread() etc.) and forking then can deadlock the child.
+    return ProcessPoolExecutor(
+        max_workers=_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+
 async def parse_repo(repo: Repository, include_files: bool = True) -> dict[str, Source]:
     sources: dict[str, Source] = {}
 
-    def add_desc(d: Any) -> None:
+    def add_desc(d: Any, files: bytes) -> None:
         source = Source.from_desc(d, repo)
         if source.name not in sources:
             sources[source.name] = source
         else:
             source = sources[source.name]
 
-        source.add_desc(d, repo)
+        source.add_desc(d, files, repo)
 
     repo_url = repo.files_url if include_files else repo.db_url
     logger.info("Loading %r" % repo_url)
-    data = await get_content_cached(repo_url, timeout=REQUEST_TIMEOUT)
-
-    with io.BytesIO(data) as f:
-        with ExtTarFile.open(fileobj=f, mode="r") as tar:
-            packages: dict[str, list] = {}
-            for info in tar:
-                package_name = info.name.split("/", 1)[0]
-                infofile = tar.extractfile(info)
-                if infofile is None:
-                    continue
-                with infofile:
-                    packages.setdefault(package_name, []).append(
-                        (info.name, infofile.read()))
-
-    for package_name, infos in sorted(packages.items()):
-        t = ""
-        for name, data in sorted(infos):
-            if name.endswith("/desc"):
-                t += data.decode("utf-8")
-            elif name.endswith("/depends"):
-                t += data.decode("utf-8")
-            elif name.endswith("/files"):
-                t += data.decode("utf-8")
-        desc = parse_desc(t)
-        add_desc(desc)
+    # Only pass the path to the worker, so the archive doesn't have to be
+    # kept in memory here and sent over to the worker
+    async with get_content_cached_file(repo_url, timeout=REQUEST_TIMEOUT) as path:
+        # Parse in worker processes, so multiple repos get parsed in parallel
+        # and the event loop stays responsive in the meantime
+        async with _get_parse_semaphore():
+            loop = asyncio.get_running_loop()
+            try:
+                descs = await loop.run_in_executor(_get_parse_executor(), parse_repo_file, path)
+            except BrokenProcessPool:
+                # a worker died, start with a new pool next time
+                _get_parse_executor.cache_clear()
+                raise
+
+    for desc, files in descs:
+        add_desc(desc, files)
 
     return sources
 
 
 def fill_rdepends(sources: dict[str, Source]) -> None:
-    deps: dict[str, dict[Package, set[DepType]]] = {}
-    for s in sources.values():
-        for p in s.packages.values():
-            for n, r in p.depends.items():
-                deps.setdefault(n, dict()).setdefault(p, set()).add(DepType.NORMAL)
-            for n, r in p.makedepends.items():
-                deps.setdefault(n, dict()).setdefault(p, set()).add(DepType.MAKE)
-            for n, r in p.optdepends.items():
-                deps.setdefault(n, dict()).setdefault(p, set()).add(DepType.OPTIONAL)
-            for n, r in p.checkdepends.items():
-                deps.setdefault(n, dict()).setdefault(p, set()).add(DepType.CHECK)
-
-    for s in sources.values():
-        for p in s.packages.values():
-            rdeps = [deps.get(p.name, dict())]
-            for prov in p.provides:
-                rdeps.append(deps.get(prov, dict()))
-
-            merged: dict[Package, set[DepType]] = {}
-            for rd in rdeps:
-                for rp, rs in rd.items():
-                    merged.setdefault(rp, set()).update(rs)
-
-            p.rdepends = merged
+    packages = [p for s in sources.values() for p in s.packages.values()]
+
+    # Each dependency kind gets visited once per package and name, so plain
+    # lists are enough here and we only need to deduplicate when merging below
+    deps: defaultdict[str, dict[Package, list[DepType]]] = defaultdict(dict)
+    for p in packages:
+        for dep_type, names in ((DepType.NORMAL, p.depends), (DepType.MAKE, p.makedepends),
+                                (DepType.OPTIONAL, p.optdepends), (DepType.CHECK, p.checkdepends)):
+            for n in names:
+                entry = deps[n]
+                if p in entry:
+                    entry[p].append(dep_type)
+                else:
+                    entry[p] = [dep_type]
+
+    # sort the reverse dependencies once here, instead of on every render
+    sort_keys = {p: (p.name.lower(), p.key) for p in packages}
+
+    def sort_key(item: tuple[Package, list[DepType]]) -> tuple[str, PackageKey]:
+        return sort_keys[item[0]]
+
+    empty: dict[Package, list[DepType]] = {}
+    for p in packages:
+        merged = deps.get(p.name, empty)
+        copied = False
+        for prov in p.provides:
+            rd = deps.get(prov)
+            if not rd:
+                continue
+            if not copied:
+                # the entries in deps can be shared with other packages
+                merged = {rp: list(rs) for rp, rs in merged.items()}
+                copied = True
+            for rp, rs in rd.items():
+                if rp in merged:
+                    types = merged[rp]
+                    types.extend(t for t in rs if t not in types)
+                else:
+                    merged[rp] = list(rs)
+
+        p.rdepends = dict(sorted(merged.items(), key=sort_key)) if merged else empty
 
 
 def fill_provided_by(sources: dict[str, Source]) -> None:
@@ -131,7 +246,7 @@ async def update_source() -> None:
     for sources in await asyncio.gather(*awaitables):
         for name, source in sources.items():
             if name in final:
-                final[name].packages.update(source.packages)
+                final[name].add_packages(source.packages)
             else:
                 final[name] = source
 
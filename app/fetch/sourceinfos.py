@@ -1,18 +1,24 @@
 # Copyright 2016-2020 Christoph Reiter
 # SPDX-License-Identifier: MIT
 
+import asyncio
 import gzip
-import json
+import hashlib
 
 from ..appconfig import REQUEST_TIMEOUT, SRCINFO_URLS
 from ..appstate import PkgExtra, SrcInfoPackage, state
 from ..pkgextra import extra_to_pkgextra_entry
 from ..utils import logger
 from .pypi import update_pypi_versions
-from .utils import check_needs_update, get_content_cached
+from .utils import check_needs_update, get_content_cached, json_loads
 
 
-async def update_sourceinfos() -> None:
+# The digest of the .SRCINFO instead of the text, so the texts of the last
+# download don't have to be kept around between updates
+SrcInfoKey = tuple[bytes, str, str, str, str]
+
+
+async def update_sourceinfos(_cache: dict[tuple[str, str], tuple[SrcInfoKey, set[SrcInfoPackage]]] = {}) -> None:
     urls = SRCINFO_URLS
     if not await check_needs_update(urls):
         return
@@ -21,15 +27,30 @@ async def update_sourceinfos() -> None:
     result: dict[str, SrcInfoPackage] = {}
     pkgextra = PkgExtra(packages={})
 
-    for url in urls:
+    async def load(url: str) -> bytes:
         logger.info("Loading %r" % url)
-        data = await get_content_cached(url, timeout=REQUEST_TIMEOUT)
-        json_obj = json.loads(gzip.decompress(data).decode("utf-8"))
+        return await get_content_cached(url, timeout=REQUEST_TIMEOUT)
+
+    # parsing is the expensive part, so reuse the packages of the last run
+    # for all entries that haven't changed
+    new_cache: dict[tuple[str, str], tuple[SrcInfoKey, set[SrcInfoPackage]]] = {}
+
+    # fetch all at once, but process in order, so later URLs take precedence
+    for data in await asyncio.gather(*(load(url) for url in urls)):
+        json_obj = json_loads(gzip.decompress(data))
         for hash_, m in json_obj.items():
             extra = m.get("extra", {})
             pkgbase = None
             for repo, srcinfo in m["srcinfo"].items():
-                for pkg in SrcInfoPackage.for_srcinfo(srcinfo, repo, m["repo"], m["path"], m["date"]):
+                digest = hashlib.blake2b(srcinfo.encode("utf-8"), digest_size=16).digest()
+                key = (digest, repo, m["repo"], m["path"], m["date"])
+                cached = _cache.get((hash_, repo))
+                if cached is not None and cached[0] == key:
+                    packages = cached[1]
+                else:
+                    packages = SrcInfoPackage.for_srcinfo(srcinfo, repo, m["repo"], m["path"], m["date"])
+                new_cache[(hash_, repo)] = (key, packages)
+                for pkg in packages:
                     pkgbase = pkg.pkgbase
                     if pkg.pkgname in result:
                         logger.info(f"WARN: duplicate: {pkg.pkgname} provided by "
@@ -38,6 +59,9 @@ async def update_sourceinfos() -> None:
             if pkgbase is not None:
                 pkgextra.packages[pkgbase] = extra_to_pkgextra_entry(extra)
 
+    _cache.clear()
+    _cache.update(new_cache)
+
     state.pkgextra = pkgextra
     state.sourceinfos = result
     await update_pypi_versions(pkgextra)
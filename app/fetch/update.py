@@ -3,14 +3,17 @@
 
 import asyncio
 import functools
+import random
 import sys
 import traceback
 from asyncio import Event
+from collections.abc import Coroutine
+from typing import Any
 
 from aiolimiter import AsyncLimiter
 
 from .. import appconfig
-from ..appconfig import UPDATE_INTERVAL, UPDATE_MIN_INTERVAL, UPDATE_MIN_RATE
+from ..appconfig import UPDATE_INTERVAL, UPDATE_MIN_INTERVAL, UPDATE_MIN_RATE, UPDATE_RETRY_INTERVAL
 from ..appstate import state
 from ..utils import logger
 from .arch import update_arch_versions
@@ -41,19 +44,36 @@ def queue_update() -> None:
     update_event.set()
 
 
+def _jitter(interval: float) -> float:
+    # so multiple instances don't all hit the servers at the same time
+    return interval * random.uniform(0.9, 1.1)
+
+
 async def trigger_loop() -> None:
     while True:
-        logger.info("Sleeping for %d" % UPDATE_INTERVAL)
-        await asyncio.sleep(UPDATE_INTERVAL)
+        interval = _jitter(UPDATE_INTERVAL)
+        logger.info("Sleeping for %d" % interval)
+        await asyncio.sleep(interval)
         queue_update()
 
+
+async def retry_later(delay: float) -> None:
+    logger.info("Retrying in %d" % delay)
+    await asyncio.sleep(delay)
+    queue_update()
+
 _background_tasks = set()
 
 
-async def update_loop() -> None:
-    task = asyncio.create_task(trigger_loop())
+def _start_background_task(coro: Coroutine[Any, Any, None]) -> None:
+    task = asyncio.create_task(coro)
     _background_tasks.add(task)
     task.add_done_callback(_background_tasks.discard)
+
+
+async def update_loop() -> None:
+    _start_background_task(trigger_loop())
+    retry_delay = UPDATE_RETRY_INTERVAL
     while True:
         async with _rate_limit:
             logger.info("check for updates")
@@ -73,9 +93,14 @@ async def update_loop() -> None:
                 ])
                 await asyncio.gather(*awaitables)
                 state.ready = True
+                retry_delay = UPDATE_RETRY_INTERVAL
                 logger.info("done")
             except Exception:
                 traceback.print_exc(file=sys.stdout)
+                # don't wait for the next regular update, in case it was
+                # something temporary, but back off if it keeps failing
+                _start_background_task(retry_later(_jitter(retry_delay)))
+                retry_delay = min(retry_delay * 2, UPDATE_INTERVAL)
         logger.info("Waiting for next update")
         await wait_for_update()
         # XXX: it seems some updates don't propagate right away, so wait a bit
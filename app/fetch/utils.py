@@ -2,20 +2,42 @@
 # SPDX-License-Identifier: MIT
 
 import asyncio
+import contextlib
 import datetime
+import functools
 import hashlib
 import os
+import tempfile
+from collections.abc import AsyncIterator
 from email.utils import parsedate_to_datetime
 from typing import Any, Optional
 from urllib.parse import quote_plus, urlparse
 
 import httpx
+import orjson
 
 from .. import appconfig
 from ..appconfig import REQUEST_TIMEOUT
 from ..utils import logger
 
 
+def json_loads(data: bytes) -> Any:
+    """Parses JSON from UTF-8 bytes, a lot faster than the json module"""
+
+    return orjson.loads(data)
+
+
+@functools.cache
+def get_client() -> httpx.AsyncClient:
+    """A client shared by all fetches, so connections get reused between them
+    and across update runs. With HTTP/2 the concurrent requests to the same
+    host share one connection instead of doing a TLS handshake each."""
+
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        transport=httpx.AsyncHTTPTransport(retries=2, http2=True))
+
+
 def get_mtime_for_response(response: httpx.Response) -> datetime.datetime | None:
     last_modified = response.headers.get("last-modified")
     if last_modified is not None:
@@ -24,17 +46,26 @@ def get_mtime_for_response(response: httpx.Response) -> datetime.datetime | None
     return None
 
 
-async def get_content_cached_mtime(url: str, *args: Any, **kwargs: Any) -> tuple[bytes, datetime.datetime | None]:
-    """Returns the content of the URL response, and a datetime object for when the content was last modified"""
+async def download_to_file(url: str, fn: str, *args: Any, **kwargs: Any) -> None:
+    """Streams the URL response to a file, without keeping it in memory.
+    The file mtime is set to the "last-modified" date of the response."""
+
+    client = get_client()
+    async with client.stream("GET", url, *args, **kwargs) as r:
+        r.raise_for_status()
+        with open(fn, "wb") as h:
+            async for chunk in r.aiter_bytes():
+                h.write(chunk)
+    mtime = get_mtime_for_response(r)
+    if mtime is not None:
+        os.utime(fn, (mtime.timestamp(), mtime.timestamp()))
 
-    # cache the file locally, and store the "last-modified" date as the file mtime
-    cache_dir = appconfig.CACHE_DIR
-    if cache_dir is None:
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            r = await client.get(url, *args, **kwargs)
-            r.raise_for_status()
-            return (r.content, get_mtime_for_response(r))
 
+async def get_cache_file(url: str, *args: Any, **kwargs: Any) -> str:
+    """Returns the path to the locally cached content of the URL, downloads it if needed"""
+
+    cache_dir = appconfig.CACHE_DIR
+    assert cache_dir is not None
     os.makedirs(cache_dir, exist_ok=True)
 
     cache_fn = quote_plus(
@@ -44,15 +75,43 @@ async def get_content_cached_mtime(url: str, *args: Any, **kwargs: Any) -> tuple
 
     fn = os.path.join(cache_dir, cache_fn)
     if not os.path.exists(fn):
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            r = await client.get(url, *args, **kwargs)
-            r.raise_for_status()
-            with open(fn, "wb") as h:
-                h.write(r.content)
-            mtime = get_mtime_for_response(r)
-            if mtime is not None:
-                os.utime(fn, (mtime.timestamp(), mtime.timestamp()))
+        # download to a temp file first, so we don't leave a truncated cache
+        # file behind on errors
+        tmp_fn = fn + ".tmp"
+        await download_to_file(url, tmp_fn, *args, **kwargs)
+        os.replace(tmp_fn, fn)
+    return fn
+
 
+@contextlib.asynccontextmanager
+async def get_content_cached_file(url: str, *args: Any, **kwargs: Any) -> AsyncIterator[str]:
+    """Like get_content_cached(), but provides a path to a file with the
+    content instead, so large downloads don't have to be kept in memory"""
+
+    if appconfig.CACHE_DIR is not None:
+        yield await get_cache_file(url, *args, **kwargs)
+        return
+
+    fd, fn = tempfile.mkstemp(suffix=".download")
+    try:
+        os.close(fd)
+        await download_to_file(url, fn, *args, **kwargs)
+        yield fn
+    finally:
+        os.unlink(fn)
+
+
+async def get_content_cached_mtime(url: str, *args: Any, **kwargs: Any) -> tuple[bytes, datetime.datetime | None]:
+    """Returns the content of the URL response, and a datetime object for when the content was last modified"""
+
+    if appconfig.CACHE_DIR is None:
+        client = get_client()
+        r = await client.get(url, *args, **kwargs)
+        r.raise_for_status()
+        return (r.content, get_mtime_for_response(r))
+
+    # cache the file locally, and use the file mtime as the "last-modified" date
+    fn = await get_cache_file(url, *args, **kwargs)
     with open(fn, "rb") as h:
         data = h.read()
     file_mtime = datetime.datetime.fromtimestamp(os.path.getmtime(fn), datetime.timezone.utc)
@@ -66,11 +125,20 @@ async def get_content_cached(url: str, *args: Any, **kwargs: Any) -> bytes:
 CacheHeaders = dict[str, Optional[str]]
 
 
-async def check_needs_update(urls: list[str], _cache: dict[str, CacheHeaders] = {}) -> bool:
+async def check_needs_update(urls: list[str]) -> bool:
     """Raises RequestException"""
 
+    return bool(await get_changed_urls(urls))
+
+
+async def get_changed_urls(urls: list[str], _cache: dict[str, CacheHeaders] = {}) -> list[str]:
+    """Returns the URLs which have changed since the last check
+
+    Raises RequestException
+    """
+
     if appconfig.CACHE_DIR:
-        return True
+        return list(urls)
 
     async def get_cache_headers(client: httpx.AsyncClient, url: str, timeout: float) -> tuple[str, CacheHeaders]:
         """This tries to return the cache response headers for a given URL as cheap as possible"""
@@ -84,6 +152,10 @@ async def check_needs_update(urls: list[str], _cache: dict[str, CacheHeaders] =
         if etag is not None:
             fetch_headers["if-none-match"] = etag
         r = await client.head(url, timeout=timeout, headers=fetch_headers)
+        if r.status_code in (405, 501):
+            # HEAD not supported, so fall back to a GET, but only look at the headers
+            async with client.stream("GET", url, timeout=timeout, headers=fetch_headers) as r:
+                pass
         if r.status_code == 304:
             return (url, dict(old_headers))
         r.raise_for_status()
@@ -92,18 +164,18 @@ async def check_needs_update(urls: list[str], _cache: dict[str, CacheHeaders] =
         new_headers["etag"] = r.headers.get("etag")
         return (url, new_headers)
 
-    needs_update = False
-    async with httpx.AsyncClient(follow_redirects=True) as client:
-        awaitables = []
-        for url in urls:
-            awaitables.append(get_cache_headers(client, url, timeout=REQUEST_TIMEOUT))
+    changed = []
+    client = get_client()
+    awaitables = []
+    for url in urls:
+        awaitables.append(get_cache_headers(client, url, timeout=REQUEST_TIMEOUT))
 
-        for url, new_cache_headers in (await asyncio.gather(*awaitables)):
-            old_cache_headers = _cache.get(url, {})
-            if old_cache_headers != new_cache_headers:
-                needs_update = True
-            _cache[url] = new_cache_headers
+    for url, new_cache_headers in (await asyncio.gather(*awaitables)):
+        old_cache_headers = _cache.get(url, {})
+        if old_cache_headers != new_cache_headers:
+            changed.append(url)
+        _cache[url] = new_cache_headers
 
-    logger.info(f"check needs update: {urls!r} -> {needs_update!r}")
+    logger.info(f"check needs update: {urls!r} -> {changed!r}")
 
-    return needs_update
+    return changed
@@ -4,7 +4,8 @@
 import re
 import sys
 import logging
-from itertools import zip_longest
+from functools import lru_cache
+from itertools import groupby
 from typing import Any
 
 
@@ -21,110 +22,103 @@ root.addHandler(handler)
 logger.setLevel(logging.DEBUG)
 
 
-def vercmp(v1: str, v2: str) -> int:
+# character type lookup table for ASCII, see vercmp()
+_VERCMP_TYPES = bytes(
+    0 if chr(i).isdigit() else 1 if chr(i).isalpha() else 2 for i in range(128))
 
-    def cmp(a: Any, b: Any) -> int:
-        res = (a > b) - (a < b)
-        assert isinstance(res, int)
-        return res
 
-    def split(v: str) -> tuple[str, str, str | None]:
-        if "~" in v:
-            e, v = v.split("~", 1)
+def _vercmp_char_type(c: str) -> int:
+    o = ord(c)
+    if o < 128:
+        return _VERCMP_TYPES[o]
+    elif c.isdigit():
+        return 0
+    elif c.isalpha():
+        return 1
+    else:
+        return 2
+
+
+@lru_cache(maxsize=16384)
+def _rpmver_key(v: str, _re: Any = re.compile("[0-9]+|[A-Za-z]+|[^0-9A-Za-z]+")) -> tuple[tuple[Any, ...], ...]:
+    """Returns a key for a part of a version which orders like rpmvercmp():
+    It's split into runs of digits, letters and other characters, where
+    letters < end of version < other < digits"""
+
+    if v.isascii():
+        types = _VERCMP_TYPES
+        parts = [(types[ord(p[0])], p) for p in _re.findall(v)]
+    else:
+        parts = [(t, "".join(g)) for t, g in groupby(v, _vercmp_char_type)]
+        # other unicode digits are compared by their value
+        parts = [(t, str(int(p)) if t == 0 else p) for t, p in parts]
+    # numbers get compared like rpm does, by their length without leading
+    # zeros first, and then lexicographically, so no need to convert them
+    key: list[tuple[Any, ...]] = []
+    for t, p in parts:
+        if t == 0:
+            p = p.lstrip("0")
+            key.append((3, len(p), p))
+        elif t == 1:
+            key.append((0, p))
         else:
-            e, v = ("0", v)
+            key.append((2, len(p)))
+    key.append((1,))
+    return tuple(key)
 
-        r: str | None = None
-        if "-" in v:
-            v, r = v.rsplit("-", 1)
-        else:
-            v, r = (v, None)
 
+def _split_version(v: str) -> tuple[str, str, str | None]:
+    """Splits a version into epoch, version and pkgrel (None if missing)"""
+
+    if "~" in v:
+        e, v = v.split("~", 1)
+    else:
+        e = "0"
+    if "-" in v:
+        v, r = v.rsplit("-", 1)
         return (e, v, r)
+    return (e, v, None)
 
-    digit, alpha, other = range(3)
 
-    def get_type(c: str) -> int:
-        assert c
-        if c.isdigit():
-            return digit
-        elif c.isalpha():
-            return alpha
-        else:
-            return other
-
-    def parse(v: str) -> list[str]:
-        parts: list[str] = []
-        current = ""
-        for c in v:
-            if not current:
-                current += c
-            else:
-                if get_type(c) == get_type(current):
-                    current += c
-                else:
-                    parts.append(current)
-                    current = c
-
-        if current:
-            parts.append(current)
-
-        return parts
-
-    def rpmvercmp(v1: str, v2: str) -> int:
-        for p1, p2 in zip_longest(parse(v1), parse(v2), fillvalue=None):
-            if p1 is None:
-                assert p2 is not None
-                if get_type(p2) == alpha:
-                    return 1
-                return -1
-            elif p2 is None:
-                assert p1 is not None
-                if get_type(p1) == alpha:
-                    return -1
-                return 1
-
-            t1 = get_type(p1)
-            t2 = get_type(p2)
-            if t1 != t2:
-                if t1 == digit:
-                    return 1
-                elif t2 == digit:
-                    return -1
-                elif t1 == other:
-                    return 1
-                elif t2 == other:
-                    return -1
-            elif t1 == other:
-                ret = cmp(len(p1), len(p2))
-                if ret != 0:
-                    return ret
-            elif t1 == digit:
-                ret = cmp(int(p1), int(p2))
-                if ret != 0:
-                    return ret
-            elif t1 == alpha:
-                ret = cmp(p1, p2)
-                if ret != 0:
-                    return ret
+# the same version pairs get compared on every update and outofdate request
+@lru_cache(maxsize=65536)
+def vercmp(v1: str, v2: str) -> int:
+    e1, v1, r1 = _split_version(v1)
+    e2, v2, r2 = _split_version(v2)
 
-        return 0
+    k1: tuple[tuple[tuple[Any, ...], ...], ...] = (_rpmver_key(e1), _rpmver_key(v1))
+    k2: tuple[tuple[tuple[Any, ...], ...], ...] = (_rpmver_key(e2), _rpmver_key(v2))
+    # the pkgrel is only compared if both have one
+    if r1 is not None and r2 is not None:
+        k1 += (_rpmver_key(r1),)
+        k2 += (_rpmver_key(r2),)
 
-    e1, v1, r1 = split(v1)
-    e2, v2, r2 = split(v2)
+    return (k1 > k2) - (k1 < k2)
 
-    ret = rpmvercmp(e1, e2)
-    if ret == 0:
-        ret = rpmvercmp(v1, v2)
-        if ret == 0 and r1 is not None and r2 is not None:
-            ret = rpmvercmp(r1, r2)
 
-    return ret
+def vercmp_key(v: str) -> tuple[tuple[tuple[Any, ...], ...], ...]:
+    """Returns a sort key for a version which orders like vercmp(), so
+    versions can be sorted without cmp_to_key().
 
+    The only difference is that a missing pkgrel sorts before any pkgrel,
+    while vercmp() ignores the pkgrel in that case.
+    """
 
-def extract_upstream_version(version: str) -> str:
-    return version.rsplit(
-        "-")[0].split("+", 1)[0].split("~", 1)[-1].split(":", 1)[-1]
+    e, v, r = _split_version(v)
+    if r is not None:
+        return (_rpmver_key(e), _rpmver_key(v), _rpmver_key(r))
+    return (_rpmver_key(e), _rpmver_key(v), ((-1,),))
+
+
+@lru_cache(maxsize=16384)
+def extract_upstream_version(
+        version: str, _re: Any = re.compile(r"(?:[^~+-]*~)?(?:[^:+-]*:)?([^+-]*)")) -> str:
+    """Strips the epoch, the pkgrel and any "+" suffix from a version.
+
+    Cached, since it's called for every source on every outofdate request.
+    """
+
+    return str(_re.match(version).group(1))
 
 
 def strip_vcs(package_name: str) -> str:
@@ -143,12 +137,24 @@ def version_is_newer_than(v1: str, v2: str) -> bool:
 
 
 def split_depends(deps: list[str]) -> dict[str, set[str]]:
+    # The same package names show up in the dependencies of thousands of
+    # packages, so intern them to only keep one copy around
     r: dict[str, set[str]] = {}
     for d in deps:
-        parts = re.split("([<>=]+)", d, 1)
-        first = parts[0].strip()
-        second = "".join(parts[1:]).strip()
-        r.setdefault(first, set()).add(second)
+        # split at the first version operator, if there is one
+        if "=" in d or "<" in d or ">" in d:
+            i = len(d)
+            for c in "<>=":
+                j = d.find(c, 0, i)
+                if j != -1:
+                    i = j
+            name, version = sys.intern(d[:i].strip()), sys.intern(d[i:].strip())
+        else:
+            name, version = sys.intern(d.strip()), ""
+        if name in r:
+            r[name].add(version)
+        else:
+            r[name] = {version}
     return r
 
 
@@ -157,9 +163,9 @@ def split_optdepends(deps: list[str]) -> dict[str, set[str]]:
     for d in deps:
         if ":" in d:
             a, b = d.split(":", 1)
-            a, b = a.strip(), b.strip()
+            a, b = sys.intern(a.strip()), b.strip()
         else:
-            a, b = d.strip(), ""
+            a, b = sys.intern(d.strip()), ""
         e = r.setdefault(a, set())
         if b:
             e.add(b)
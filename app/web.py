@@ -6,10 +6,14 @@ from __future__ import annotations
 import os
 import re
 import datetime
+import email.utils
+import heapq
 from enum import Enum
+from functools import lru_cache
 import urllib.parse
+from operator import attrgetter, itemgetter
 from typing import Any, Optional, NamedTuple
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
 
 import jinja2
 import markupsafe
@@ -18,10 +22,11 @@ from fastapi import APIRouter, Request, Depends, Response, FastAPI
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import RedirectResponse, HTMLResponse
 from fastapi_etag import Etag
+from fastapi_etag.dependency import CacheHit
 from fastapi.staticfiles import StaticFiles
 from fastapi_etag import add_exception_handler as add_etag_exception_handler
 
-from .appstate import state, get_repositories, Package, Source, DepType, SrcInfoPackage, get_base_group_name, Vulnerability, Severity, PackageKey
+from .appstate import state, get_repositories, filter_search_entries, Package, Source, DepType, SrcInfoPackage, get_base_group_name, Vulnerability, Severity, PackageKey, ExtInfo
 from .utils import extract_upstream_version, version_is_newer_than
 
 router = APIRouter(default_response_class=HTMLResponse)
@@ -64,6 +69,30 @@ async def get_etag(request: Request) -> str:
     return state.etag
 
 
+@lru_cache(maxsize=1)
+def _format_http_date(timestamp: float) -> str:
+    # the state changes rarely, so this is the same for most requests
+    return email.utils.formatdate(timestamp, usegmt=True)
+
+
+class StateEtag(Etag):
+    """Like Etag, but also sets Last-Modified to the time of the last state
+    change, so caching proxies can revalidate responses as well"""
+
+    def __init__(self) -> None:
+        super().__init__(get_etag)
+
+    async def __call__(self, request: Request, response: Response) -> str | None:
+        last_modified = _format_http_date(state.last_update)
+        try:
+            etag: str | None = await super().__call__(request, response)
+        except CacheHit as e:
+            e.headers = {**(e.headers or {}), "last-modified": last_modified}
+            raise
+        response.headers["last-modified"] = last_modified
+        return etag
+
+
 def template_filter(name: str) -> Callable:
     def wrap(f: Callable) -> Callable:
         templates.env.filters[name] = f
@@ -102,34 +131,41 @@ def vulnerability_color(request: Request, vuln: Vulnerability) -> str:
         return "secondary"
 
 
+def _package_url_prefix(request: Request) -> str:
+    # Looking up the route is slow and all package URLs only differ in the
+    # name, so only do it once per request
+    prefix: str | None = getattr(request.state, "package_url_prefix", None)
+    if prefix is None:
+        prefix = str(request.url_for("package", package_name="_"))[:-1]
+        request.state.package_url_prefix = prefix
+    return prefix
+
+
 @context_function("package_url")
-def package_url(request: Request, package: Package, name: str | None = None) -> str:
-    res: str = ""
+def package_url(request: Request, package: Package, name: str | None = None,
+                _re: Any = re.compile("[<>=]+")) -> str:
+    res: str = _package_url_prefix(request)
     if name is None:
-        res = str(request.url_for("package", package_name=name or package.name))
-        if package.repo_variant:
-            res += "?variant=" + package.repo_variant
+        res += package.name
     else:
-        res = str(request.url_for("package", package_name=re.split("[<>=]+", name)[0]))
-        if package.repo_variant:
-            res += "?variant=" + package.repo_variant
+        res += _re.split(name, 1)[0]
+    if package.repo_variant:
+        res += "?variant=" + package.repo_variant
     return res
 
 
-def _license_to_html(license: str) -> str:
+def _license_to_html(license: str, _scanner: Any = re.Scanner([  # type: ignore
+        (r"[A-Za-z0-9.+-]+", lambda scanner, token: ("LICENSE", token)),
+        (r"[^A-Za-z0-9.+-]+", lambda scanner, token: ("TEXT", token)),
+])) -> str:
 
     def create_url(license: str) -> str:
         fn = urllib.parse.quote(license)
         return f"https://spdx.org/licenses/{fn}.html"
 
     def spdx_to_html(s: str) -> str:
-        scanner = re.Scanner([  # type: ignore
-            (r"[A-Za-z0-9.+-]+", lambda scanner, token: ("LICENSE", token)),
-            (r"[^A-Za-z0-9.+-]+", lambda scanner, token: ("TEXT", token)),
-        ])
-
         done = []
-        for t, token in scanner.scan(s)[0]:
+        for t, token in _scanner.scan(s)[0]:
             if t == "LICENSE":
                 if token.upper() in ["AND", "OR", "WITH"]:
                     done.append(str(markupsafe.escape(token)))
@@ -152,7 +188,7 @@ def _license_to_html(license: str) -> str:
 
 
 @context_function("licenses_to_html")
-def licenses_to_html(request: Request, licenses: list[str]) -> str:
+def licenses_to_html(request: Request, licenses: Sequence[str]) -> str:
     done = []
     for license in licenses:
         needs_quote = (" " in license.strip()) and len(licenses) > 1
@@ -166,7 +202,7 @@ def licenses_to_html(request: Request, licenses: list[str]) -> str:
 
 
 @template_filter("rdepends_type")
-def rdepends_type(types: set[DepType]) -> list[str]:
+def rdepends_type(types: Sequence[DepType]) -> list[str]:
     if list(types) == [DepType.NORMAL]:
         return []
     names = []
@@ -183,8 +219,9 @@ def rdepends_type(types: set[DepType]) -> list[str]:
 
 
 @template_filter("rdepends_sort")
-def rdepends_sort(rdepends: dict[Package, set[str]]) -> list[tuple[Package, set[str]]]:
-    return sorted(rdepends.items(), key=lambda x: (x[0].name.lower(), x[0].key))
+def rdepends_sort(rdepends: dict[Package, list[DepType]]) -> list[tuple[Package, list[DepType]]]:
+    # fill_rdepends() already sorts them by name
+    return list(rdepends.items())
 
 
 @template_filter('timestamp')
@@ -206,9 +243,9 @@ def filter_filesize(d: int) -> str:
 
 
 @template_filter("group_by_repo")
-def group_by_repo(packages: dict[PackageKey, Package]) -> list[tuple[str, list[Package]]]:
+def group_by_repo(packages: Sequence[tuple[PackageKey, Package]]) -> list[tuple[str, list[Package]]]:
     res: dict[str, list[Package]] = {}
-    for _, p in sorted(packages.items()):
+    for _, p in packages:
         res.setdefault(p.repo, []).append(p)
     sorted_res = []
     for repo in get_repositories():
@@ -227,30 +264,28 @@ Disallow: /search?*
     return Response(content=data, media_type='text/plain')
 
 
-@router.get('/repos', dependencies=[Depends(Etag(get_etag))])
+@router.get('/repos', dependencies=[Depends(StateEtag())])
 async def repos(request: Request, response: Response) -> Response:
     return templates.TemplateResponse(request, "repos.html", {"repos": get_repositories()}, headers=dict(response.headers))
 
 
-@router.get('/stats', dependencies=[Depends(Etag(get_etag))])
+@router.get('/stats', dependencies=[Depends(StateEtag())])
 async def stats(request: Request, response: Response) -> Response:
     return templates.TemplateResponse(request, "stats.html", {}, headers=dict(response.headers))
 
 
-@router.get('/mirrors', dependencies=[Depends(Etag(get_etag))])
+@router.get('/mirrors', dependencies=[Depends(StateEtag())])
 async def mirrors(request: Request, response: Response) -> Response:
     return templates.TemplateResponse(request, "mirrors.html", {}, headers=dict(response.headers))
 
 
-@router.get('/', dependencies=[Depends(Etag(get_etag))])
+@router.get('/', dependencies=[Depends(StateEtag())])
 async def index(request: Request, response: Response) -> Response:
     return RedirectResponse(request.url_for('queue'), headers=dict(response.headers))
 
 
-@router.get('/base', dependencies=[Depends(Etag(get_etag))])
+@router.get('/base', dependencies=[Depends(StateEtag())])
 async def baseindex(request: Request, response: Response, repo: str | None = None) -> Response:
-    global state
-
     repo_filter = repo or None
     repos = get_repositories()
 
@@ -271,10 +306,8 @@ async def baseindex(request: Request, response: Response, repo: str | None = Non
     }, headers=dict(response.headers))
 
 
-@router.get('/base/{base_name}', dependencies=[Depends(Etag(get_etag))])
+@router.get('/base/{base_name}', dependencies=[Depends(StateEtag())])
 async def base(request: Request, response: Response, base_name: str) -> Response:
-    global state
-
     if base_name in state.sources:
         res = [state.sources[base_name]]
     else:
@@ -284,10 +317,8 @@ async def base(request: Request, response: Response, base_name: str) -> Response
     }, status_code=200 if res else 404, headers=dict(response.headers))
 
 
-@router.get('/security', dependencies=[Depends(Etag(get_etag))])
+@router.get('/security', dependencies=[Depends(StateEtag())])
 async def security(request: Request, response: Response) -> Response:
-    global state
-
     def sort_key(s: Source) -> tuple:
         v: Vulnerability | None = s.worst_active_vulnerability
         assert v is not None
@@ -303,8 +334,8 @@ async def security(request: Request, response: Response) -> Response:
     }, headers=dict(response.headers))
 
 
-@router.get('/group/', dependencies=[Depends(Etag(get_etag))])
-@router.get('/group/{group_name}', dependencies=[Depends(Etag(get_etag))])
+@router.get('/group/', dependencies=[Depends(StateEtag())])
+@router.get('/group/{group_name}', dependencies=[Depends(StateEtag())])
 async def group(request: Request, response: Response, group_name: str | None = None) -> Response:
     params = {}
     if group_name is not None:
@@ -312,83 +343,70 @@ async def group(request: Request, response: Response, group_name: str | None = N
     return RedirectResponse(request.url_for('groups', **params), headers=dict(response.headers))
 
 
-@router.get('/groups/', dependencies=[Depends(Etag(get_etag))])
-@router.get('/groups/{group_name}', dependencies=[Depends(Etag(get_etag))])
-async def groups(request: Request, response: Response, group_name: str | None = None) -> Response:
-    global state
+def get_group_counts() -> dict[str, int]:
+    return {name: len(packages) for name, packages in state.packages_by_group.items()}
+
+
+def get_base_groups() -> dict[str, dict[str, int]]:
+    """Maps base group names to their groups and package counts"""
+
+    base_groups: dict[str, dict[str, int]] = {}
+    for name, packages in state.packages_by_group.items():
+        for p in packages:
+            groups = base_groups.setdefault(get_base_group_name(p, name), {})
+            groups[name] = groups.get(name, 0) + 1
+    return base_groups
+
 
+@router.get('/groups/', dependencies=[Depends(StateEtag())])
+@router.get('/groups/{group_name}', dependencies=[Depends(StateEtag())])
+async def groups(request: Request, response: Response, group_name: str | None = None) -> Response:
     if group_name is not None:
-        res = []
-        for s in state.sources.values():
-            for k, p in sorted(s.packages.items()):
-                if group_name in p.groups:
-                    res.append(p)
+        res = state.packages_by_group.get(group_name, [])
 
         return templates.TemplateResponse(request, "group.html", {
             "name": group_name,
             "packages": res,
         }, status_code=200 if res else 404, headers=dict(response.headers))
     else:
-        groups: dict[str, int] = {}
-        for s in state.sources.values():
-            for k, p in sorted(s.packages.items()):
-                for name in p.groups:
-                    groups[name] = groups.get(name, 0) + 1
+        groups = state.get_derived("group_counts", get_group_counts)
         return templates.TemplateResponse(request, 'groups.html', {
             "groups": groups,
         }, headers=dict(response.headers))
 
 
-@router.get('/basegroups/', dependencies=[Depends(Etag(get_etag))])
-@router.get('/basegroups/{group_name}', dependencies=[Depends(Etag(get_etag))])
+@router.get('/basegroups/', dependencies=[Depends(StateEtag())])
+@router.get('/basegroups/{group_name}', dependencies=[Depends(StateEtag())])
 async def basegroups(request: Request, response: Response, group_name: str | None = None) -> Response:
-    global state
-
+    base_groups = state.get_derived("base_groups", get_base_groups)
     if group_name is not None:
-        groups: dict[str, int] = {}
-        for s in state.sources.values():
-            for k, p in sorted(s.packages.items()):
-                for name in p.groups:
-                    base_name = get_base_group_name(p, name)
-                    if base_name == group_name:
-                        groups[name] = groups.get(name, 0) + 1
+        groups = base_groups.get(group_name, {})
 
         return templates.TemplateResponse(request, "basegroup.html", {
             "name": group_name,
             "groups": groups,
         }, status_code=200 if groups else 404, headers=dict(response.headers))
     else:
-        base_groups: dict[str, set[str]] = {}
-        for s in state.sources.values():
-            for k, p in sorted(s.packages.items()):
-                for name in p.groups:
-                    base_name = get_base_group_name(p, name)
-                    base_groups.setdefault(base_name, set()).add(name)
-
         return templates.TemplateResponse(request, 'basegroups.html', {
             "base_groups": base_groups,
         }, headers=dict(response.headers))
 
 
-@router.get('/package/', dependencies=[Depends(Etag(get_etag))])
+@router.get('/package/', dependencies=[Depends(StateEtag())])
 async def packages_redir(request: Request, response: Response) -> Response:
     return RedirectResponse(
         request.url_for('packages').include_query_params(**request.query_params),
         headers=dict(response.headers))
 
 
-@router.get('/packages/', dependencies=[Depends(Etag(get_etag))])
+@router.get('/packages/', dependencies=[Depends(StateEtag())])
 async def packages(request: Request, response: Response, repo: str | None = None, variant: str | None = None) -> Response:
-    global state
-
     repo = repo or get_repositories()[0].name
 
     packages = []
-    for s in state.sources.values():
-        for k, p in sorted(s.packages.items()):
-            if p.repo == repo:
-                if not variant or p.repo_variant == variant:
-                    packages.append((s, p))
+    for s, p in state.packages_by_repo.get(repo, []):
+        if not variant or p.repo_variant == variant:
+            packages.append((s, p))
 
     repos = get_repositories()
     return templates.TemplateResponse(request, "packages.html", {
@@ -398,29 +416,21 @@ async def packages(request: Request, response: Response, repo: str | None = None
     }, headers=dict(response.headers))
 
 
-@router.get('/package/{package_name}', dependencies=[Depends(Etag(get_etag))])
+@router.get('/package/{package_name}', dependencies=[Depends(StateEtag())])
 async def package_redir(request: Request, response: Response, package_name: str) -> Response:
     return RedirectResponse(
         request.url_for('package', package_name=package_name).include_query_params(**request.query_params),
         headers=dict(response.headers))
 
 
-@router.get('/packages/{package_name}', dependencies=[Depends(Etag(get_etag))])
+@router.get('/packages/{package_name}', dependencies=[Depends(StateEtag())])
 async def package(request: Request, response: Response, package_name: str, repo: str | None = None, variant: str | None = None) -> Response:
-    global state
+    def matches(p: Package) -> bool:
+        return (not repo or p.repo == repo) and (not variant or p.repo_variant == variant)
 
-    packages = []
-    provides = []
-    for s in state.sources.values():
-        for k, p in sorted(s.packages.items()):
-            is_package_exact = (package_name is None or p.name == package_name)
-            if is_package_exact or package_name in p.provides:
-                if not repo or p.repo == repo:
-                    if not variant or p.repo_variant == variant:
-                        if is_package_exact:
-                            packages.append((s, p))
-                        else:
-                            provides.append((s, p))
+    packages = [(s, p) for s, p in state.packages_by_name.get(package_name, []) if matches(p)]
+    provides = [(s, p) for s, p in state.packages_by_provides.get(package_name, [])
+                if p.name != package_name and matches(p)]
 
     if not packages and provides:
         return templates.TemplateResponse(request, "packagevirtual.html", {
@@ -433,22 +443,27 @@ async def package(request: Request, response: Response, package_name: str, repo:
         }, status_code=200 if packages else 404, headers=dict(response.headers))
 
 
-@router.get('/updates', dependencies=[Depends(Etag(get_etag))])
+def get_newest_packages(repo_filter: str | None) -> list[Package]:
+    packages = (p for s in state.sources.values() for p in s.packages.values()
+                if repo_filter is None or p.repo == repo_filter)
+    # only the newest ones are shown, no need to sort all of them
+    return heapq.nlargest(250, packages, key=attrgetter("builddate"))
+
+
+@router.get('/updates', dependencies=[Depends(StateEtag())])
 async def updates(request: Request, response: Response, repo: str = "") -> Response:
 
     repo_filter = repo or None
     repos = get_repositories()
 
-    packages: list[Package] = []
-    for s in state.sources.values():
-        for p in s.packages.values():
-            if repo_filter is not None and p.repo != repo_filter:
-                continue
-            packages.append(p)
-    packages.sort(key=lambda p: p.builddate, reverse=True)
+    # only cache for known repos, so the cache can't grow without bounds
+    if repo_filter is None or any(r.name == repo_filter for r in repos):
+        packages = state.get_derived(("updates", repo_filter), lambda: get_newest_packages(repo_filter))
+    else:
+        packages = get_newest_packages(repo_filter)
 
     return templates.TemplateResponse(request, "updates.html", {
-        "packages": packages[:250],
+        "packages": packages,
         "repos": repos,
         "repo_filter": repo_filter,
     }, headers=dict(response.headers))
@@ -458,28 +473,52 @@ def get_transitive_depends(related: list[str]) -> set[str]:
     if not related:
         return set()
 
-    db_depends: dict[str, set[str]] = {}
-    related_pkgs = set()
-    for s in state.sources.values():
-        for p in s.packages.values():
-            if s.name in related:
-                related_pkgs.add(p.name)
-            db_depends.setdefault(p.name, set()).update(p.depends.keys())
+    todo: set[str] = set()
+    for name in related:
+        if name in state.sources:
+            todo.update(p.name for p in state.sources[name].packages.values())
 
-    todo = set(related_pkgs)
+    # only look at the packages we reach, instead of collecting the
+    # dependencies of all packages first
+    packages_by_name = state.packages_by_name
     done = set()
     while todo:
         name = todo.pop()
         if name in done:
             continue
         done.add(name)
-        if name in db_depends:
-            todo.update(db_depends[name])
+        for s, p in packages_by_name.get(name, []):
+            todo.update(p.depends.keys())
 
     return done
 
 
-@router.get('/outofdate', dependencies=[Depends(Etag(get_etag))])
+OutOfDateVersions = tuple[Source, str, str, Optional[ExtInfo], bool]
+
+
+def get_outofdate_versions() -> list[OutOfDateVersions]:
+    """Returns the repo version, the newer git version (or an empty string),
+    the upstream info and if upstream is newer for all sources which aren't
+    internal"""
+
+    entries: list[OutOfDateVersions] = []
+    for s in state.sources.values():
+        if "internal" in s.pkgextra.references:
+            continue
+
+        msys_version = extract_upstream_version(s.version)
+        git_version = extract_upstream_version(s.git_version)
+        if not version_is_newer_than(git_version, msys_version):
+            git_version = ""
+
+        info = s.upstream_info
+        is_outdated = info is not None and info.version is not None and \
+            version_is_newer_than(info.version, msys_version)
+        entries.append((s, msys_version, git_version, info, is_outdated))
+    return entries
+
+
+@router.get('/outofdate', dependencies=[Depends(StateEtag())])
 async def outofdate(request: Request, response: Response, related: str | None = None, repo: str = "") -> Response:
 
     repo_filter = repo or None
@@ -499,10 +538,11 @@ async def outofdate(request: Request, response: Response, related: str | None =
     for s in state.sources.values():
         if repo_filter is not None and repo_filter not in s.repos:
             continue
-
         all_sources.append(s)
 
-        if "internal" in s.pkgextra.references:
+    # the versions only depend on the state, so compute them once per state change
+    for s, msys_version, git_version, info, is_outdated in state.get_derived("outofdate", get_outofdate_versions):
+        if repo_filter is not None and repo_filter not in s.repos:
             continue
 
         if related_depends:
@@ -512,14 +552,8 @@ async def outofdate(request: Request, response: Response, related: str | None =
             else:
                 continue
 
-        msys_version = extract_upstream_version(s.version)
-        git_version = extract_upstream_version(s.git_version)
-        if not version_is_newer_than(git_version, msys_version):
-            git_version = ""
-
-        info = s.upstream_info
         if info is not None and info.version is not None:
-            if version_is_newer_than(info.version, msys_version):
+            if is_outdated:
                 to_update.append((s, msys_version, git_version, info.version, info.url, info.date))
         else:
             missing.append(s)
@@ -584,29 +618,23 @@ def get_status_category(key: str) -> str:
         return DANGER
 
 
+# from least to most important
+_STATUS_PRIORITY = {status.value: i for i, status in enumerate([
+    PackageStatus.FINISHED,
+    PackageStatus.FINISHED_BUT_INCOMPLETE,
+    PackageStatus.FINISHED_BUT_BLOCKED,
+    PackageStatus.WAITING_FOR_DEPENDENCIES,
+    PackageStatus.WAITING_FOR_BUILD,
+    PackageStatus.UNKNOWN,
+    PackageStatus.MANUAL_BUILD_REQUIRED,
+    PackageStatus.FAILED_TO_BUILD,
+])}
+
+
 def get_status_priority(key: str) -> tuple[int, str]:
     """We want to show the most important status as the primary one"""
 
-    try:
-        status = PackageStatus(key)
-    except ValueError:
-        return (-1, key)
-
-    order = [
-        PackageStatus.FINISHED,
-        PackageStatus.FINISHED_BUT_INCOMPLETE,
-        PackageStatus.FINISHED_BUT_BLOCKED,
-        PackageStatus.WAITING_FOR_DEPENDENCIES,
-        PackageStatus.WAITING_FOR_BUILD,
-        PackageStatus.UNKNOWN,
-        PackageStatus.MANUAL_BUILD_REQUIRED,
-        PackageStatus.FAILED_TO_BUILD,
-    ]
-
-    try:
-        return (order.index(status), key)
-    except ValueError:
-        return (-1, key)
+    return (_STATUS_PRIORITY.get(key, -1), key)
 
 
 def repo_to_build_type(repo: str) -> list[str]:
@@ -655,37 +683,41 @@ def get_build_status(srcinfo: SrcInfoPackage, build_types: set[str] = set()) ->
     return results
 
 
-@router.get('/queue', dependencies=[Depends(Etag(get_etag))])
-async def queue(request: Request, response: Response, build_type: str = "") -> Response:
-    # Create entries for all packages where the version doesn't match
+UpdateEntry = tuple[SrcInfoPackage, Optional[Source], Optional[Package], list[PackageBuildStatus]]
+RemovalEntry = tuple[Package, dict[Package, list[DepType]]]
 
-    UpdateEntry = tuple[SrcInfoPackage, Optional[Source], Optional[Package], list[PackageBuildStatus]]
 
-    build_filter = build_type or None
+def get_queue(build_filter: str | None) -> tuple[list[UpdateEntry], list[RemovalEntry]]:
+    # Create entries for all packages where the version doesn't match
+
     srcinfo_repos: dict[str, set[str]] = {}
 
     grouped: dict[str, UpdateEntry] = {}
+    outdated: dict[str, tuple[SrcInfoPackage, Package]] = {}
     for s in state.sources.values():
-        for k, p in sorted(s.packages.items()):
+        for k, p in s.sorted_packages:
             if p.name in state.sourceinfos:
                 srcinfo = state.sourceinfos[p.name]
                 if build_filter is not None and build_filter not in repo_to_build_type(srcinfo.repo):
                     continue
                 if version_is_newer_than(srcinfo.build_version, p.version):
                     srcinfo_repos.setdefault(srcinfo.pkgbase, set()).update(repo_to_build_type(srcinfo.repo))
-                    repo_list = srcinfo_repos[srcinfo.pkgbase] if not build_filter else {build_filter}
-                    new_src = state.sources.get(srcinfo.pkgbase)
-                    grouped[srcinfo.pkgbase] = (srcinfo, new_src, p, get_build_status(srcinfo, repo_list))
+                    outdated[srcinfo.pkgbase] = (srcinfo, p)
+
+    # only the last package per pkgbase is kept, so only get the build status for that one
+    for pkgbase, (srcinfo, p) in outdated.items():
+        repo_list = srcinfo_repos[pkgbase] if not build_filter else {build_filter}
+        new_src = state.sources.get(pkgbase)
+        grouped[pkgbase] = (srcinfo, new_src, p, get_build_status(srcinfo, repo_list))
 
     # new packages
     available: dict[str, list[SrcInfoPackage]] = {}
     for srcinfo in state.sourceinfos.values():
         if build_filter is not None and build_filter not in repo_to_build_type(srcinfo.repo):
             continue
+        if srcinfo.pkgname in state.package_names:
+            continue
         available.setdefault(srcinfo.pkgname, []).append(srcinfo)
-    for s in state.sources.values():
-        for p in s.packages.values():
-            available.pop(p.name, None)
 
     # only one per pkgbase
     for srcinfos in available.values():
@@ -706,7 +738,7 @@ async def queue(request: Request, response: Response, build_type: str = "") -> R
         reverse=True)
 
     # get all packages in the pacman repo which are no in GIT
-    removals = []
+    removals: list[RemovalEntry] = []
     for s in state.sources.values():
         for k, p in s.packages.items():
             if build_filter is not None and build_filter not in repo_to_build_type(p.repo):
@@ -716,22 +748,36 @@ async def queue(request: Request, response: Response, build_type: str = "") -> R
                 # and also is ok to remove if there is a replacement
                 removals.append((p, p.rdepends))
 
+    return updates, removals
+
+
+@router.get('/queue', dependencies=[Depends(StateEtag())])
+async def queue(request: Request, response: Response, build_type: str = "") -> Response:
+    build_filter = build_type or None
+    # only depends on the state, so compute it once per state change and filter,
+    # but only for filters we know, so the cache can't grow without bounds
+    build_types = get_build_types()
+    if build_filter is None or build_filter in build_types:
+        updates, removals = state.get_derived(("queue", build_filter), lambda: get_queue(build_filter))
+    else:
+        updates, removals = get_queue(build_filter)
+
     return templates.TemplateResponse(request, "queue.html", {
         "updates": updates,
         "removals": removals,
-        "build_types": get_build_types(),
+        "build_types": build_types,
         "build_filter": build_filter,
         "cycles": state.build_status.cycles,
     }, headers=dict(response.headers))
 
 
-@router.get('/new', dependencies=[Depends(Etag(get_etag))])
-@router.get('/removals', dependencies=[Depends(Etag(get_etag))])
+@router.get('/new', dependencies=[Depends(StateEtag())])
+@router.get('/removals', dependencies=[Depends(StateEtag())])
 async def new(request: Request, response: Response) -> Response:
     return RedirectResponse(request.url_for('queue'), headers=dict(response.headers))
 
 
-@router.get('/search', dependencies=[Depends(Etag(get_etag))])
+@router.get('/search', dependencies=[Depends(StateEtag())])
 async def search(request: Request, response: Response, q: str = "", t: str = "") -> Response:
     query = q
     qtype = t
@@ -741,7 +787,9 @@ async def search(request: Request, response: Response, q: str = "", t: str = "")
 
     parts = query.split()
     parts_lower = [p.lower() for p in parts]
-    res_pkg: list[tuple[float, Package | Source]] = []
+    # (negated score, lowercase name, result), so we can sort by the first two
+    # without a Python key function
+    matches: list[tuple[float, str, Package | Source]] = []
 
     def get_score(name: str, parts: list[str]) -> float:
         score = 0.0
@@ -751,29 +799,31 @@ async def search(request: Request, response: Response, q: str = "", t: str = "")
             score += name.count(part) * len(part) / len(name)
         return score
 
+    # The realname is always part of the name, so only the names are indexed
     if not query:
         pass
     elif qtype == "pkg":
-        for s in state.sources.values():
-            score = get_score(s.realname.lower(), parts_lower)
+        for s, realname, name in filter_search_entries(
+                state.source_search_names, state.source_search_index, parts_lower):
+            score = get_score(realname, parts_lower)
             if score >= 0:
-                res_pkg.append((score, s))
+                matches.append((-score, name, s))
                 continue
-            score = get_score(s.name.lower(), parts_lower)
+            score = get_score(name, parts_lower)
             if score >= 0:
-                res_pkg.append((score, s))
-        res_pkg.sort(key=lambda e: (-e[0], e[1].name.lower()))
+                matches.append((-score, name, s))
     elif qtype == "binpkg":
-        for s in state.sources.values():
-            for sub in s.packages.values():
-                score = get_score(sub.realname.lower(), parts_lower)
-                if score >= 0:
-                    res_pkg.append((score, sub))
-                    continue
-                score = get_score(sub.name.lower(), parts_lower)
-                if score >= 0:
-                    res_pkg.append((score, sub))
-        res_pkg.sort(key=lambda e: (-e[0], e[1].name.lower()))
+        for s, sub, realname, name in filter_search_entries(
+                state.package_search_names, state.package_search_index, parts_lower):
+            score = get_score(realname, parts_lower)
+            if score >= 0:
+                matches.append((-score, name, sub))
+                continue
+            score = get_score(name, parts_lower)
+            if score >= 0:
+                matches.append((-score, name, sub))
+    matches.sort(key=itemgetter(0, 1))
+    res_pkg = [(-score, r) for score, name, r in matches]
 
     return templates.TemplateResponse(request, "search.html", {
         "results": res_pkg,
@@ -6,6 +6,7 @@ os.environ["NO_MIDDLEWARE"] = "1"
 
 import pytest
 from app import app
+from app.appstate import state
 from fastapi.testclient import TestClient
 
 
@@ -18,3 +19,9 @@ def client():
 
 def test_api(client):
     client.get('/api/buildqueue2').raise_for_status()
+
+
+def test_outofdate_etag(client):
+    etag = client.get('/api/outofdate').headers["etag"]
+    state.sourceinfos = dict(state.sourceinfos)
+    assert client.get('/api/outofdate').headers["etag"] != etag
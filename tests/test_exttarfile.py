@@ -1,6 +1,9 @@
 import io
+import tarfile
 
-from app.exttarfile import ExtTarFile
+import pytest
+
+from app.exttarfile import ExtTarFile, iter_tar_files, iter_tar_stream
 
 
 def test_zst() -> None:
@@ -19,3 +22,44 @@ def test_zst() -> None:
             infofile = tar.extractfile(info)
             assert infofile is not None
             assert infofile.read() == b''
+
+
+def test_iter_tar_files() -> None:
+    def make_tar(names: list[str], format: int = tarfile.PAX_FORMAT) -> bytes:
+        f = io.BytesIO()
+        with tarfile.open(fileobj=f, mode="w:gz", format=format) as tar:
+            for name in names:
+                info = tarfile.TarInfo(name)
+                info.size = len(name)
+                tar.addfile(info, io.BytesIO(name.encode()))
+        return f.getvalue()
+
+    data = make_tar(["foo/desc", "foo/files", "foo/mtree", "bar/desc"])
+    assert list(iter_tar_files(data, ("/desc", "/files"))) == [
+        ("foo/desc", b"foo/desc"), ("foo/files", b"foo/files"), ("bar/desc", b"bar/desc")]
+
+    # long names need pax or GNU headers
+    long_name = "x" * 200 + "/desc"
+    for format in [tarfile.PAX_FORMAT, tarfile.GNU_FORMAT]:
+        assert list(iter_tar_files(make_tar([long_name, "foo/desc"], format), ("/desc",))) == [
+            (long_name, long_name.encode()), ("foo/desc", b"foo/desc")]
+
+    with pytest.raises(tarfile.ReadError):
+        list(iter_tar_files(b"foo", ("/desc",)))
+
+
+def test_iter_tar_stream() -> None:
+    f = io.BytesIO()
+    with tarfile.open(fileobj=f, mode="w") as tar:
+        for name, mtime in [("a/foo.ebuild", 1), ("a/package.mask", 2), ("b" * 120 + ".ebuild", 3.5)]:
+            info = tarfile.TarInfo(name)
+            info.size = len(name)
+            info.mtime = mtime
+            tar.addfile(info, io.BytesIO(name.encode()))
+        info = tarfile.TarInfo("a/dir")
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+    f.seek(0)
+
+    assert list(iter_tar_stream(f, ("/package.mask",))) == [
+        ("a/foo.ebuild", 1, None), ("a/package.mask", 2, b"a/package.mask"), ("b" * 120 + ".ebuild", 3, None)]
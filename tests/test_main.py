@@ -1,14 +1,20 @@
 # type: ignore
 
+import io
 import os
+import tarfile
+import zlib
 
 os.environ["NO_MIDDLEWARE"] = "1"
 
 import pytest
+from functools import cmp_to_key
 from app import app
-from app.appstate import SrcInfoPackage, parse_packager
+from app.appstate import AppState, SrcInfoPackage, build_search_index, cleanup_files, filter_search_entries, \
+    parse_packager, state
 from app.fetch.cygwin import parse_cygwin_versions
-from app.utils import split_optdepends, strip_vcs, vercmp
+from app.fetch.source import parse_desc, parse_repo_data, parse_repo_file
+from app.utils import split_depends, split_optdepends, strip_vcs, vercmp, vercmp_key, extract_upstream_version
 from app.pkgextra import extra_to_pkgextra_entry
 from fastapi.testclient import TestClient
 
@@ -30,13 +36,45 @@ def test_main_endpoints(client, endpoint):
     r = client.get('/' + endpoint)
     assert r.status_code == (404 if "/" in endpoint else 200)
     assert "etag" in r.headers
+    assert "last-modified" in r.headers
     etag = r.headers["etag"]
     r = client.get('/' + endpoint, headers={"if-none-match": etag})
     assert r.status_code == 304
+    assert "last-modified" in r.headers
     r = client.get('/' + endpoint, headers={"if-none-match": "nope"})
     assert r.status_code == (404 if "/" in endpoint else 200)
 
 
+def test_region_etag():
+    state = AppState()
+    etag = state.get_etag("sources", "ext_infos")
+    state.sourceinfos = {}
+    assert state.get_etag("sources", "ext_infos") == etag
+    state.sources = {}
+    assert state.get_etag("sources", "ext_infos") != etag
+
+
+def test_get_derived():
+    state = AppState()
+    calls = []
+    assert state.get_derived("foo", lambda: calls.append(1) or 42) == 42
+    assert state.get_derived("foo", lambda: calls.append(1) or 42) == 42
+    assert len(calls) == 1
+    state.sources = {}
+    assert state.get_derived("foo", lambda: calls.append(1) or 42) == 42
+    assert len(calls) == 2
+
+
+def test_derived_cache_bounded(client):
+    client.get('/queue?build_type=msys').raise_for_status()
+    client.get('/updates?repo=msys').raise_for_status()
+    size = len(state._derived_cache)
+    for i in range(10):
+        client.get(f'/queue?build_type=nope{i}').raise_for_status()
+        client.get(f'/updates?repo=nope{i}').raise_for_status()
+    assert len(state._derived_cache) == size
+
+
 def test_parse_cygwin_versions():
     data = b"""\
 @ python36
@@ -118,6 +156,69 @@ build-depends: cygport
     assert versions["headers"].version == "11.0.1"
 
 
+def test_parse_desc():
+    desc = parse_desc(
+        "%NAME%\nfoo\n\n%PGPSIG%\nabc\n\n%DEPENDS%\nbar\nquux>=1\n\n"
+        "%FILES%\nusr/\nusr/bin/foo\n")
+    assert desc == {
+        "%NAME%": ["foo"],
+        "%DEPENDS%": ["bar", "quux>=1"],
+        "%FILES%": ["usr/", "usr/bin/foo"],
+    }
+
+
+def test_parse_repo_data():
+    f = io.BytesIO()
+    with tarfile.open(fileobj=f, mode="w:gz") as tar:
+        for name, data in [("foo-1.0-1/desc", "%NAME%\nfoo\n\n"),
+                           ("bar-1.0-1/desc", "%NAME%\nbar\n"),
+                           ("bar-1.0-1/files", "%FILES%\nusr/\n"),
+                           ("bar-1.0-1/mtree", "ignored\n"),
+                           ("foo-1.0-1/files", "%FILES%\nusr/bin/\n")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data.encode()))
+
+    assert [(d, zlib.decompress(files)) for d, files in parse_repo_data(f.getvalue())] == [
+        ({"%NAME%": ["bar"]}, b"/usr/"),
+        ({"%NAME%": ["foo"]}, b"/usr/bin/"),
+    ]
+
+
+def test_parse_repo_file(tmp_path):
+    f = io.BytesIO()
+    with tarfile.open(fileobj=f, mode="w:gz") as tar:
+        for name, data in [("foo-1.0-1/desc", "%NAME%\nfoo\n\n"),
+                           ("foo-1.0-1/files", "%FILES%\nusr/\nusr/bin/\nusr/bin/foo\n")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data.encode()))
+    path = tmp_path / "repo.files"
+    path.write_bytes(f.getvalue())
+
+    [(desc, files)] = parse_repo_file(str(path))
+    assert desc == {"%NAME%": ["foo"]}
+    assert zlib.decompress(files) == b"/usr/bin/foo"
+
+
+def test_search_index():
+    names = ["mingw-w64-zlib", "zlib", "python-zlib-ng", "python"]
+    index = build_search_index(names)
+    assert filter_search_entries(names, index, ["zlib"]) == ["mingw-w64-zlib", "zlib", "python-zlib-ng"]
+    assert filter_search_entries(names, index, ["zlib", "python"]) == ["python-zlib-ng"]
+    assert filter_search_entries(names, index, ["nope"]) == []
+    # too short for the index, so everything is a candidate
+    assert filter_search_entries(names, index, ["py"]) == names
+    assert filter_search_entries(names, index, []) == names
+
+
+def test_cleanup_files():
+    assert cleanup_files([]) == []
+    assert cleanup_files(["usr/bin/foo", "usr/", "usr/bin/", "usr/share/", "etc/"]) == [
+        "/etc/", "/usr/bin/foo", "/usr/share/"]
+    assert cleanup_files(["usr/lib/", "usr/lib-foo"]) == ["/usr/lib-foo", "/usr/lib/"]
+
+
 def test_parse_packager():
     info = parse_packager("foobar")
     assert info.name == "foobar"
@@ -128,6 +229,13 @@ def test_parse_packager():
     assert info.email == "foobar@msys2.org"
 
 
+def test_split_depends():
+    assert split_depends(["foo"]) == {'foo': {''}}
+    assert split_depends(["foo>=1.0", "foo<2"]) == {'foo': {'>=1.0', '<2'}}
+    assert split_depends(["foo = 1.0"]) == {'foo': {'= 1.0'}}
+    assert split_depends(["foo>=1<2"]) == {'foo': {'>=1<2'}}
+
+
 def test_split_optdepends():
     assert split_optdepends(["foo: bar"]) == {'foo': {'bar'}}
     assert split_optdepends(["foo: bar", "foo: quux"]) == {'foo': {'bar', 'quux'}}
@@ -178,6 +286,18 @@ pkgname = libarchive-devel
     assert list(packages)[0].pkgbasedesc == "base-desc"
 
 
+def test_extract_upstream_version():
+    assert extract_upstream_version("1.2.3-1") == "1.2.3"
+    assert extract_upstream_version("1.2.3") == "1.2.3"
+    assert extract_upstream_version("2~1.2.3-1") == "1.2.3"
+    assert extract_upstream_version("2:1.2.3-1") == "1.2.3"
+    assert extract_upstream_version("1.2.3+4-1") == "1.2.3"
+    assert extract_upstream_version("1~2~3") == "2~3"
+    assert extract_upstream_version("a~b:c:d") == "c:d"
+    assert extract_upstream_version("1-2~3") == "1"
+    assert extract_upstream_version("") == ""
+
+
 def test_vercmp():
 
     def test_ver(a, b, res):
@@ -206,11 +326,22 @@ def test_vercmp():
     test_ver(".", "1", -1)
     test_ver(".", "a", 1)
     test_ver("a1", "1", -1)
+    test_ver("1.\u0663", "1.2", 1)
+    test_ver("1.\u00e9", "1.a", 1)
 
     # FIXME:
     # test_ver(".0", "0", 1)
 
 
+def test_vercmp_key():
+    versions = ["1.0-1", "1.0-2", "1.0a-1", "1.0.1-1", "2~0.1-1", "1.0rc1-1", "1.0+1-1", "10-1", "9-1"]
+    expected = sorted(versions, key=cmp_to_key(vercmp))
+    assert sorted(versions, key=vercmp_key) == expected
+    for a in versions:
+        for b in versions:
+            assert (vercmp_key(a) > vercmp_key(b)) - (vercmp_key(a) < vercmp_key(b)) == vercmp(a, b)
+
+
 def test_extra_to_pkgextra_entry():
     assert extra_to_pkgextra_entry(
         {"references": ['foo: quux', 'bar']}